@@ -11,15 +11,25 @@ import netrc
 import os
 import sys
 import textwrap
-import openai
 import re
 import json
-import curses
-from openai.api_resources import model
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from response_cache import ResponseCache, request_key
+from model_catalog import ModelCatalog
+
+# openai, requests and curses are imported where they are used, so cached
+# answers and --model runs start without loading them
+
+# Cache of answers to repeated questions, disabled with OPENAI_CACHE=0
+RESPONSE_CACHE = None if os.environ.get('OPENAI_CACHE') == '0' else ResponseCache()
 
 # Function to display a supplied list
 def curses_list(stdscr):
     '''Display a list in Curses'''
+    import curses
 
     # Clear the screen
     stdscr.clear()
@@ -81,59 +91,258 @@ def get_netrc_credentials(machine):
     except KeyError:
         return None, None
 
+# Function to list the errors worth retrying
+def retry_errors():
+    """Throttling, timeout and server side openai errors."""
+    import openai
+    return (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+        openai.error.APIError, openai.error.Timeout, openai.error.APIConnectionError,
+        openai.error.TryAgain)
+
+# Class to talk to the OpenAI API over pooled connections.
+class OpenAIClient:
+    """
+    Reads the API key once and sends completions over a pooled HTTP
+    session, one prompt at a time or a batch of prompts concurrently.
+
+    api_base overrides openai.api_base (e.g. a mock server), workers bounds
+    concurrent batch requests, and failed requests are retried up to
+    retries times with exponential backoff starting at backoff seconds.
+    """
+
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key  = api_key
+        self.api_base = kwargs.get('api_base')
+        self.workers  = kwargs.get('workers', 8)
+        self.retries  = kwargs.get('retries', 3)
+        self.backoff  = kwargs.get('backoff', 0.5)
+        self.timeout  = kwargs.get('timeout', 60)
+        self.cache    = kwargs.get('cache', RESPONSE_CACHE)
+        self.session  = None
+
+    def connect(self):
+        """Create the pooled session on first use and hand it to openai."""
+        if self.session is None:
+            import openai
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            # One keep-alive connection per worker, shared with the openai package
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            openai.requestssession = self.session = session
+        return self.session
+
+    def credentials(self):
+        """Return the API key, reading ~/.netrc on first use."""
+        if self.api_key is None:
+            self.api_key = get_netrc_credentials("openai")[1]
+        return self.api_key
+
+    def _call(self, create, **params):
+        """Call an openai API function, retrying transient failures."""
+        self.connect()
+        for attempt in range(self.retries + 1):
+            try:
+                return create(api_key=self.credentials(), api_base=self.api_base, **params)
+            except retry_errors() as error:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logging.warning("OpenAI request failed (%s), retrying in %.1fs", error, delay)
+                time.sleep(delay)
+
+    @staticmethod
+    def parameters(prompt, **kwargs):
+        """Completion parameters for prompt, defaults filled in."""
+        return {
+            'model': kwargs.get('model', 'code-davinci-003'),
+            'prompt': prompt,
+            'temperature': kwargs.get('temperature', 0.7),
+            'max_tokens': kwargs.get('max_tokens', 1900),
+            'top_p': kwargs.get('top_p', 0.9),
+            'frequency_penalty': kwargs.get('frequency_penalty', 0.0),
+            'presence_penalty': kwargs.get('presence_penalty', 0.0),
+        }
+
+    def complete(self, prompt, **kwargs):
+        """
+        Return the completion text for prompt. Keywords are the completion
+        parameters, plus cache to use another ResponseCache (None for none)
+        and bypass_cache to skip the lookup.
+        """
+
+        # keywords & vars
+        cache  = kwargs.get('cache', self.cache)
+        bypass = kwargs.get('bypass_cache', False)
+        params = self.parameters(prompt, **kwargs)
+
+        # Answer repeated questions from the response cache
+        key = request_key(**params)
+        if cache is not None and not bypass:
+            answer = cache.get(key)
+            if answer is not None:
+                logging.info("OpenAi task (cached): %s", prompt)
+                return answer
+
+        import openai
+        logging.info("OpenAi task: %s", prompt)
+        response = self._call(openai.Completion.create,
+            request_timeout=self.timeout, **params)
+
+        answer = response.choices[0].text
+        if cache is not None:
+            cache.put(key, answer)
+        return answer
+
+    def stream(self, prompt, **kwargs):
+        """
+        Yield the completion text for prompt piece by piece as the tokens
+        arrive. Takes the same keywords as complete(); a cached answer is
+        yielded whole, and a fully read answer is cached.
+        """
+
+        # keywords & vars
+        cache  = kwargs.get('cache', self.cache)
+        bypass = kwargs.get('bypass_cache', False)
+        params = self.parameters(prompt, **kwargs)
+
+        key = request_key(**params)
+        if cache is not None and not bypass:
+            answer = cache.get(key)
+            if answer is not None:
+                logging.info("OpenAi task (cached): %s", prompt)
+                yield answer
+                return
+
+        # Retries only cover the request, not a stream that already started
+        import openai
+        logging.info("OpenAi task (streamed): %s", prompt)
+        response = self._call(openai.Completion.create,
+            request_timeout=self.timeout, stream=True, **params)
+
+        pieces = []
+        for chunk in response:
+            text = chunk.choices[0].text if chunk.choices else ''
+            if text:
+                pieces.append(text)
+                yield text
+
+        if cache is not None:
+            cache.put(key, ''.join(pieces))
+
+    def complete_many(self, prompts, **kwargs):
+        """
+        Complete every prompt with at most workers requests in flight and
+        return the answers in prompt order. With return_exceptions=True a
+        prompt that still fails after its retries yields its exception
+        instead of aborting the batch.
+        """
+
+        # keywords & vars
+        return_exceptions = kwargs.pop('return_exceptions', False)
+
+        def complete(prompt):
+            try:
+                return self.complete(prompt, **kwargs)
+            except Exception as error:
+                if not return_exceptions:
+                    raise
+                return error
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='openai') as pool:
+            return list(pool.map(complete, prompts))
+
+    def models(self):
+        """Return the list of available engines."""
+        import openai
+        return self._call(openai.Engine.list)
+
+# Shared client, created on first use
+CLIENT = None
+
+# Class to signal missing OpenAI credentials.
+class MissingCredentialsError(RuntimeError):
+    """No OpenAI API key in ~/.netrc."""
+
+# Function to get the shared OpenAI client
+def get_openai_client():
+    """Return the shared OpenAIClient, raising MissingCredentialsError without credentials."""
+    global CLIENT
+
+    if CLIENT is None:
+        CLIENT = OpenAIClient()
+    if CLIENT.credentials() is None:
+        raise MissingCredentialsError("No OpenAI credentials found.")
+    return CLIENT
+
 # Function to ask OpenAI a question
 def get_openai_text(task, **kwargs):
     """ OpenAI query for task. """
 
     # keywords & vars
-    model = kwargs.get('model', 'code-davinci-003')
+    model  = kwargs.pop('model', 'code-davinci-003')
+    client = kwargs.pop('client', None) or get_openai_client()
 
-    # Get OpenAI credentials
-    openai.api_key = get_netrc_credentials("openai")[1]
+    return client.complete(task, model=model, **kwargs)
 
-    if openai.api_key is None:
-        print("No OpenAI credentials found.")
-        sys.exit(1)
+# Function to stream the answer to an OpenAI question
+def get_openai_stream(task, **kwargs):
+    """ OpenAI query for task, yielding the answer as it arrives. """
 
-    # Get OpenAI response
-    else:
-        logging.info("OpenAi task: %s", task)
-        response = openai.Completion.create(
-            model=model,
-            prompt=task,
-            temperature=0.7,
-            max_tokens=1900,
-            top_p=0.9,
-            frequency_penalty=0.0,
-            presence_penalty=0.0)
-
-    return response.choices[0].text
+    # keywords & vars
+    model  = kwargs.pop('model', 'code-davinci-003')
+    client = kwargs.pop('client', None) or get_openai_client()
+
+    return client.stream(task, model=model, **kwargs)
+
+# Function to ask OpenAI many questions at once
+def get_openai_texts(tasks, **kwargs):
+    """ OpenAI queries for tasks, answered concurrently and in order. """
+
+    # keywords & vars
+    model  = kwargs.pop('model', 'code-davinci-003')
+    client = kwargs.pop('client', None) or get_openai_client()
+
+    return client.complete_many(tasks, model=model, **kwargs)
 
 # function that will get a list of available openai model
 def get_openai_models():
     """ Get list of available OpenAI models. """
+    return get_openai_client().models()
 
-    # Get OpenAI credentials
-    openai.api_key = get_netrc_credentials("openai")[1]
+# function that will get the ids of the available openai models
+def get_openai_model_ids():
+    """ Get the ids of the available OpenAI models. """
+    return [model['id'] for model in get_openai_models().data]
 
-    if openai.api_key is None:
-        print("No OpenAI credentials found.")
-        sys.exit(1)
-
-    # Get OpenAI response
-    else:
-        models = openai.Engine.list()
-        return models
+# Model ids, cached on disk for a day
+MODELS = ModelCatalog(get_openai_model_ids)
 
 if __name__ == "__main__":
     # Set environment basename for output files
     basename = os.path.splitext(os.path.basename(__file__))[0]
 
-    # Read task from any type of stdin
-    if not sys.stdin.isatty():
+    parser = argparse.ArgumentParser(prog=basename, description='Ask OpenAI a question.')
+    parser.add_argument('prompt', nargs='*', help='question, read from stdin if omitted')
+    parser.add_argument('-m', '--model', default=os.environ.get('OPENAI_MODEL'),
+        help='model to use instead of picking one (default $OPENAI_MODEL)')
+    parser.add_argument('--no-cache', action='store_true', help='skip the response cache')
+    parser.add_argument('--batch', action='store_true',
+        help='ask every line as its own question, concurrently')
+    parser.add_argument('--refresh-models', action='store_true',
+        help='refetch the model catalog before picking')
+    args = parser.parse_args()
+
+    # Read task from the command line or any type of stdin
+    if args.prompt:
+        message = [' '.join(args.prompt)]
+    elif not sys.stdin.isatty():
         message = sys.stdin.readlines()
     else:
-        message = sys.argv[1:]
+        message = []
 
     # Initialize logging
     logfile = basename + '.log'
@@ -141,25 +350,47 @@ if __name__ == "__main__":
     logging.info('-' * 80)
 
     # Get OpenAI response
-    if (openai.api_key != 'None') and (message != []):
-        ctitle = "Select OpenAI text model to use..."
+    if message != []:
+        try:
+            get_openai_client()
+        except MissingCredentialsError as error:
+            print(error)
+            sys.exit(1)
 
-        # Extract the IDs that match the specified pattern
-        pattern = re.compile(r"^text-([a-z]+)-[0-9]+$")
+        model = args.model
+        if model is None:
+            import curses
+            ctitle = "Select OpenAI text model to use..."
 
-        # Query OpenAI for models
-        citems = [model["id"] for model in get_openai_models().data if pattern.match(model["id"])]
-        citems.sort()
+            # Extract the IDs that match the specified pattern
+            pattern = re.compile(r"^text-([a-z]+)-[0-9]+$")
 
-        # Display list for user selection
-        model = curses.wrapper(curses_list)
+            # Query OpenAI for models, from the local catalog when possible
+            citems = [model for model in MODELS.models(refresh=args.refresh_models)
+                      if pattern.match(model)]
+            citems.sort()
+
+            # Display list for user selection
+            model = curses.wrapper(curses_list)
 
         # Query OpenAI API for text
-        if model != None:
-            text = get_openai_text(message, model=model)
-            logging.info(text)
+        if model != None and args.batch:
+            prompts = [line.strip() for line in message if line.strip()]
+            texts = get_openai_texts(prompts, model=model, bypass_cache=args.no_cache,
+                return_exceptions=True)
+            print(f"\033[44m\033[1mModel: {model}\033[0m")
+            for prompt, text in zip(prompts, texts):
+                logging.info(text)
+                print(f"\033[1m{prompt}\033[0m")
+                print(f"Error: {text}" if isinstance(text, Exception) else text)
+        elif model != None:
             print(f"\033[44m\033[1mModel: {model}\033[0m")
-            print(text)
+            pieces = []
+            for piece in get_openai_stream(''.join(message), model=model, bypass_cache=args.no_cache):
+                print(piece, end='', flush=True)
+                pieces.append(piece)
+            print()
+            logging.info(''.join(pieces))
         else:
             print("No GPT3 model selected...")
 
@@ -168,5 +399,8 @@ if __name__ == "__main__":
         No query string to send to OpenAi...
         Example:
         $ ask_openai.py "Write ansible task to Ensure HTTP server is not enabled using REL 8 CIS benckmark"
+        $ ask_openai.py --model text-davinci-003 "..."    # skip the model picker
+        $ ask_openai.py --no-cache "..."    # skip the response cache
+        $ ask_openai.py --batch < prompts.txt    # one prompt per line, asked concurrently
         """))
         sys.exit(1)
@@ -0,0 +1,632 @@
+#!/bin/env -S python3
+"""
+Benchmarks for the stock chart and bot hot paths.
+
+Every stage runs against deterministic synthetic OHLCV data and local
+stand-ins for yfinance, the Telegram Bot API and OpenAI, so results only
+depend on this machine. Results are written as JSON and compared against a
+saved baseline.
+
+Example:
+$ benchmark.py --quick
+$ benchmark.py indicators render --output results.json --baseline baseline.json
+$ benchmark.py --save-baseline baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas
+import numpy
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot
+from mplfinance.original_flavor import candlestick_ohlc
+
+# Local imports
+import indicators
+import candlestick_chart as chart
+from market_store import MarketStore, period_timedelta
+
+# Minutes per bar of the /chart intervals
+INTERVAL_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '1d': 390}
+
+# (interval, period) cases from 1m to 1d bars and 1d to 1y periods
+CASES = [('1m', '1d'), ('5m', '7d'), ('15m', '14d'), ('1h', '3m'), ('1d', '1y'), ('1m', '1m')]
+QUICK_CASES = [('15m', '14d'), ('1d', '1y')]
+
+# Function to create deterministic OHLCV data.
+def synthetic_ohlcv(bars, **kwargs):
+    """
+    Random-walk OHLCV bars shaped like a yfinance download read back from
+    CSV (RangeIndex and a Datetime string column).
+    """
+
+    # keywords & vars
+    interval = kwargs.get('interval', '15m')
+    seed     = kwargs.get('seed', 0)
+    start    = kwargs.get('start', '2023-01-03 09:30')
+    timezone = kwargs.get('timezone', 'America/New_York')
+
+    index = session_index(bars, interval=interval, start=start, timezone=timezone)
+    frame = _random_walk(len(index), seed).set_axis(index, axis=0)
+    frame.index.name = 'Date' if interval == '1d' else 'Datetime'
+    if interval == '1d':
+        labels = frame.index.strftime('%Y-%m-%d')
+    else:
+        labels = frame.index.astype(str)
+    frame = frame.reset_index(drop=True)
+    frame.insert(0, 'Date' if interval == '1d' else 'Datetime', labels)
+    return frame
+
+# Function to create session-aligned timestamps.
+def session_index(bars, **kwargs):
+    """
+    bars timestamps of interval inside 09:30-16:00 sessions on weekdays,
+    starting with the session of start.
+    """
+
+    # keywords & vars
+    interval = kwargs.get('interval', '15m')
+    start    = kwargs.get('start', '2023-01-03 09:30')
+    timezone = kwargs.get('timezone', 'America/New_York')
+
+    minutes = INTERVAL_MINUTES[interval]
+    per_day = max(390 // minutes, 1)
+    days = pandas.bdate_range(pandas.Timestamp(start).normalize(), periods=-(-bars // per_day))
+    offsets = pandas.to_timedelta(numpy.arange(per_day) * minutes + 570, unit='min')
+    if interval == '1d':
+        offsets = pandas.to_timedelta([0], unit='min')
+    stamps = (days.values[:, None] + offsets.values[None, :]).ravel()[:bars]
+    return pandas.DatetimeIndex(stamps).tz_localize(timezone)
+
+# Function to make random-walk prices.
+def _random_walk(bars, seed):
+    """OHLCV columns of a geometric random walk."""
+    rng = numpy.random.default_rng(seed)
+    close = 100 * numpy.exp(numpy.cumsum(rng.normal(0, 0.002, bars)))
+    opens = numpy.concatenate([[close[0]], close[:-1]])
+    spread = numpy.abs(rng.normal(0, 0.001, bars)) * close
+    return pandas.DataFrame({
+        'Open': opens,
+        'High': numpy.maximum(opens, close) + spread,
+        'Low': numpy.minimum(opens, close) - spread,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1_000, 100_000, bars).astype(float),
+    })
+
+# Function to count the bars of a case.
+def case_bars(interval, period):
+    """Approximate number of bars yfinance returns for (interval, period)."""
+    days = max(int(period_timedelta(period).days * 5 / 7), 1)
+    return days * max(390 // INTERVAL_MINUTES[interval], 1)
+
+# Class to stand in for yfinance.download.
+class SyntheticDownloader:
+    """Callable with the yfinance.download signature returning synthetic bars."""
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.calls = 0
+
+    def __call__(self, tickers, interval='1d', period=None, start=None, **kwargs):
+        self.calls += 1
+        bars = case_bars(interval, period or '1d')
+        frame = synthetic_ohlcv(bars, interval=interval, seed=self.seed)
+        frame = frame.set_index(pandas.DatetimeIndex(pandas.to_datetime(frame.iloc[:, 0], utc=True),
+            name=frame.columns[0])).drop(columns=frame.columns[0])
+        if start is not None:
+            frame = frame[frame.index >= pandas.Timestamp(start)]
+        return frame
+
+# Function to time a callable.
+def time_call(func, repeat=5):
+    """Return the wall-clock seconds of repeat calls to func."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+# Function to record a stage that could not run.
+def failed(benchmark, case, error):
+    """Result entry for a stage that raised instead of finishing."""
+    return {'benchmark': benchmark, 'case': case, 'error': f'{type(error).__name__}: {error}'}
+
+# Function to summarize timings.
+def summarize(benchmark, case, timings, items=1, **extra):
+    """Latency percentiles and throughput of a list of timings."""
+    timings = numpy.asarray(timings)
+    return {
+        'benchmark': benchmark,
+        'case': case,
+        'runs': len(timings),
+        'mean_ms': float(timings.mean() * 1000),
+        'p50_ms': float(numpy.percentile(timings, 50) * 1000),
+        'p95_ms': float(numpy.percentile(timings, 95) * 1000),
+        'p99_ms': float(numpy.percentile(timings, 99) * 1000),
+        'throughput_per_s': float(items / timings.mean()),
+        **extra,
+    }
+
+# Function to stub out the network-bound collaborators.
+def _offline(store_root):
+    """Point the bot at synthetic data, a stubbed metadata cache and a fresh store."""
+    import telegram_bot
+    chart.METADATA.fetcher = lambda symbol: {'shortName': f'{symbol} Inc'}
+    chart.METADATA.entries.setdefault('BENCH', {'shortName': 'BENCH Inc', 'fetched': time.time()})
+    telegram_bot.STORE = MarketStore(store_root, downloader=SyntheticDownloader())
+    return telegram_bot
+
+# Function to benchmark loading price data.
+def bench_load(quick=False, repeat=5):
+    """get_ticker_data served from the columnar store, and the legacy CSV parse."""
+    cases = QUICK_CASES if quick else CASES
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        telegram_bot = _offline(root)
+        for interval, period in cases:
+            case = f'{interval}-{period}'
+            telegram_bot.get_ticker_data('BENCH', interval=interval, period=period)
+            timings = time_call(lambda: telegram_bot.get_ticker_data('BENCH',
+                interval=interval, period=period), repeat)
+            bars = len(telegram_bot.get_ticker_data('BENCH', interval=interval, period=period))
+            results.append(summarize('load.store', case, timings, bars, bars=bars))
+
+            csvfile = os.path.join(root, f'{case}.csv')
+            telegram_bot.STORE.frame('BENCH', interval, period).to_csv(csvfile, index=False)
+            timings = time_call(lambda: pandas.read_csv(csvfile), repeat)
+            results.append(summarize('load.csv', case, timings, bars, bars=bars))
+
+    # Coarser charts of a symbol whose 15m bars cover them, counting downloads
+    with tempfile.TemporaryDirectory() as root:
+        telegram_bot = _offline(root)
+        telegram_bot.get_ticker_data('BENCH', interval='15m', period='3m')
+        for interval, period in [('30m', '14d'), ('1h', '3m'), ('1d', '3m')]:
+            case = f'{interval}-{period}'
+            downloads = telegram_bot.STORE.downloader.calls
+            telegram_bot.get_ticker_data('BENCH', interval=interval, period=period)
+            downloads = telegram_bot.STORE.downloader.calls - downloads
+            timings = time_call(lambda: telegram_bot.get_ticker_data('BENCH',
+                interval=interval, period=period), repeat)
+            bars = len(telegram_bot.get_ticker_data('BENCH', interval=interval, period=period))
+            results.append(summarize('load.resampled', case, timings, bars, bars=bars,
+                downloads=downloads))
+    return results
+
+# Function to compute every overlay's indicators on one graph.
+def _shared_indicators(dataframe):
+    """Bollinger, Ichimoku and VWAP from one IndicatorGraph."""
+    graph = indicators.IndicatorGraph(dataframe)
+    return graph.bollinger(), graph.ichimoku(), graph.vwap()
+
+# Function to benchmark the indicator math.
+def bench_indicators(quick=False, repeat=5):
+    """Each indicator over each case."""
+    cases = QUICK_CASES if quick else CASES
+    results = []
+    for interval, period in cases:
+        bars = case_bars(interval, period)
+        dataframe = synthetic_ohlcv(bars, interval=interval)
+        case = f'{interval}-{period}'
+        for name, func in (
+                ('bollinger', lambda: indicators.bollinger(dataframe['Close'])),
+                ('ichimoku', lambda: indicators.ichimoku(dataframe['High'], dataframe['Low'],
+                    dataframe['Close'])),
+                ('vwap', lambda: indicators.vwap(dataframe['Close'], dataframe['Volume'])),
+                ('all_separate', lambda: (indicators.bollinger(dataframe['Close']),
+                    indicators.ichimoku(dataframe['High'], dataframe['Low'], dataframe['Close']),
+                    indicators.vwap(dataframe['Close'], dataframe['Volume']))),
+                ('all_shared', lambda: _shared_indicators(dataframe))):
+            results.append(summarize(f'indicator.{name}', case, time_call(func, repeat),
+                bars, bars=bars))
+    return results
+
+# Function to benchmark the /scan screener.
+def bench_scan(quick=False, repeat=3):
+    """
+    A 15m-14d scan of a synthetic universe: loading it through the store,
+    the per-symbol indicator loop it replaces, and the vectorized screen in
+    one process and split across processes.
+    """
+    import screener
+    symbols = 100 if quick else 500
+    case = f'{symbols}x15m-14d'
+    bars = case_bars('15m', '14d')
+    frames = {f'S{seed:03d}': synthetic_ohlcv(bars, interval='15m', seed=seed)
+              for seed in range(symbols)}
+    conditions = list(screener.CONDITIONS)
+    results = []
+
+    with tempfile.TemporaryDirectory() as root:
+        telegram_bot = _offline(root)
+        telegram_bot.get_tickers_data(list(frames), interval='15m', period='14d')
+        results.append(summarize('scan.load', case, time_call(lambda: telegram_bot.get_tickers_data(
+            list(frames), interval='15m', period='14d'), repeat), symbols))
+
+    def loop():
+        for frame in frames.values():
+            indicators.bollinger(frame['Close'])
+            indicators.vwap(frame['Close'], frame['Volume'])
+            indicators.ichimoku(frame['High'], frame['Low'], frame['Close'])
+    results.append(summarize('scan.loop', case, time_call(loop, repeat), symbols))
+
+    matched = len(screener.scan(frames, conditions))
+    results.append(summarize('scan.vectorized', case, time_call(
+        lambda: screener.scan(frames, conditions), repeat), symbols, matched=matched))
+
+    # Split across a long-lived pool, as the bot does through its dispatcher
+    workers = max(os.cpu_count() or 1, 2)
+    split = -(-symbols // workers)
+    with ProcessPoolExecutor(max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver')) as pool:
+        screener.scan(frames, conditions, pool_map=pool.map, split=split)
+        results.append(summarize('scan.processes', f'{case}-j{workers}', time_call(
+            lambda: screener.scan(frames, conditions, pool_map=pool.map, split=split),
+            repeat), symbols, matched=matched))
+    return results
+
+# Function to benchmark rendering and encoding.
+def bench_render(quick=False, repeat=3):
+    """
+    graph_candlestick plus each overlay drawn, savefig at 600 dpi, every
+    output profile, and a long history with and without downsampling.
+    """
+    cases = QUICK_CASES if quick else CASES
+    results = []
+    for interval, period in cases:
+        bars = case_bars(interval, period)
+        dataframe = synthetic_ohlcv(bars, interval=interval)
+        case = f'{interval}-{period}'
+        for overlay in list(chart.OVERLAYS) + ['bollinger+vwap+ichimoku']:
+            def draw():
+                chart.graph_candlestick(dataframe, symbol='BENCH', name='BENCH Inc',
+                    interval=interval, period=period)
+                chart.overlay_chart(dataframe, overlay)
+                pyplot.gcf().canvas.draw()
+                pyplot.close('all')
+            try:
+                results.append(summarize(f'render.{overlay}', case, time_call(draw, repeat),
+                    bars, bars=bars))
+            except Exception as error:
+                pyplot.close('all')
+                results.append(failed(f'render.{overlay}', case, error))
+
+        def encode():
+            chart.graph_candlestick(dataframe, symbol='BENCH', name='BENCH Inc')
+            chart.overlay_vwap(dataframe)
+            start = time.perf_counter()
+            image = chart.encode_png(pyplot, 600)
+            return time.perf_counter() - start, len(image)
+        try:
+            encoded = [encode() for _ in range(repeat)]
+            results.append(summarize('encode.png600', case, [seconds for seconds, _ in encoded],
+                bars=bars, bytes=encoded[-1][1]))
+        except Exception as error:
+            pyplot.close('all')
+            results.append(failed('encode.png600', case, error))
+
+        # Each output profile: drawing at its resolution, encoding and image size
+        for profile in chart.OUTPUT_PROFILES:
+            def output():
+                start = time.perf_counter()
+                dpi = chart.output_dpi(profile)
+                chart.graph_candlestick(dataframe, symbol='BENCH', name='BENCH Inc', dpi=dpi)
+                chart.overlay_vwap(dataframe, dpi=dpi)
+                pyplot.gcf().canvas.draw()
+                drawn = time.perf_counter()
+                image = chart.encode_image(pyplot, profile)
+                return drawn - start, time.perf_counter() - drawn, len(image)
+            try:
+                outputs = [output() for _ in range(repeat)]
+                results.append(summarize(f'output.{profile}', case,
+                    [draw + encode for draw, encode, _ in outputs], bars=bars,
+                    draw_ms=float(numpy.median([draw for draw, _, _ in outputs]) * 1000),
+                    encode_ms=float(numpy.median([encode for _, encode, _ in outputs]) * 1000),
+                    bytes=outputs[-1][2]))
+            except Exception as error:
+                pyplot.close('all')
+                results.append(failed(f'output.{profile}', case, error))
+
+    # A long history drawn bar for bar versus downsampled to the 600 dpi output width
+    bars = case_bars('1m', '1m' if quick else '3m')
+    dataframe = synthetic_ohlcv(bars, interval='1m')
+    timings = {}
+    for downsample in (False, True):
+        timings[downsample] = time_call(lambda: chart.render_png(dataframe, symbol='BENCH',
+            name='BENCH Inc', chart='ichimoku', downsample=downsample), repeat)
+    results.append(summarize('render.full', f'{bars}', timings[False], bars))
+    results.append(summarize('render.downsampled', f'{bars}', timings[True], bars,
+        speedup=min(timings[False]) / min(timings[True])))
+    return results
+
+# Function to render candlesticks the way graph_candlestick used to.
+def _render_artists(dataframe):
+    """Per-bar Rectangle/Line2D candlesticks via candlestick_ohlc."""
+    fig, ax = pyplot.subplots(figsize=(12,3), dpi=80)
+    candlestick_ohlc(ax, list(zip(list(dataframe.index.tolist()),
+            dataframe["Open"].tolist(),
+            dataframe["High"].tolist(),
+            dataframe["Low"].tolist(),
+            dataframe["Close"].tolist()
+        )),
+        width = 0.55,
+        colorup = "green",
+        colordown = "red"
+    )
+    fig.canvas.draw()
+    pyplot.close(fig)
+
+# Function to render candlesticks with the batched collections.
+def _render_collections(dataframe):
+    """Two-collection candlesticks via candlestick_collections."""
+    fig, ax = pyplot.subplots(figsize=(12,3), dpi=80)
+    chart.candlestick_collections(ax, numpy.arange(len(dataframe)),
+        dataframe["Open"], dataframe["High"], dataframe["Low"], dataframe["Close"],
+        width = 0.55,
+        colorup = "green",
+        colordown = "red"
+    )
+    fig.canvas.draw()
+    pyplot.close(fig)
+
+# Function to compare candlestick render times.
+def bench_candlestick(quick=False, repeat=3):
+    """Compare artist-per-bar and collection candlestick rendering."""
+    sizes = (500, 2_000) if quick else (500, 2_000, 10_000)
+    results = []
+    for bars in sizes:
+        dataframe = synthetic_ohlcv(bars, interval='1m')
+        artists = time_call(lambda: _render_artists(dataframe), repeat)
+        collections = time_call(lambda: _render_collections(dataframe), repeat)
+        results.append(summarize('candlestick.artists', str(bars), artists, bars))
+        results.append(summarize('candlestick.collections', str(bars), collections, bars,
+            speedup=min(artists) / min(collections)))
+    return results
+
+# Function to benchmark whole bot commands.
+def bench_commands(quick=False, repeat=3):
+    """
+    /chart (download, render, upload) and /ask against the fake Telegram
+    Bot API, synthetic yfinance data and the mock OpenAI server.
+    """
+    cases = QUICK_CASES[:1] if quick else QUICK_CASES
+    import telegram
+    import ask_openai
+    from fake_telegram import FakeBotAPI
+    from mock_openai import MockOpenAI
+
+    results = []
+    api = FakeBotAPI().start()
+    completions = MockOpenAI().start()
+    ask_openai.CLIENT = ask_openai.OpenAIClient('sk-bench', api_base=completions.api_base,
+        cache=None)
+    bot = telegram.Bot(token='123456:BENCH', base_url=api.base_url)
+
+    with tempfile.TemporaryDirectory() as root:
+        telegram_bot = _offline(root)
+
+        for interval, period in cases:
+            message = types.SimpleNamespace(chat_id=1, text=f'/chart BENCH interval={interval} period={period}')
+            def run_chart():
+                telegram_bot.RENDER_CACHE.entries.clear()
+                telegram_bot.RENDER_CACHE.size = 0
+                telegram_bot.command_chart(bot, message)
+            try:
+                results.append(summarize('command.chart', f'{interval}-{period}',
+                    time_call(run_chart, repeat)))
+                cached = time_call(lambda: telegram_bot.command_chart(bot, message), repeat)
+                results.append(summarize('command.chart_cached', f'{interval}-{period}', cached))
+            except Exception as error:
+                pyplot.close('all')
+                results.append(failed('command.chart', f'{interval}-{period}', error))
+
+        message = types.SimpleNamespace(chat_id=1, text='/ask benchmark')
+        results.append(summarize('command.ask', 'mock', time_call(
+            lambda: telegram_bot.command_ask(bot, message), repeat * 5)))
+
+    api.stop()
+    completions.stop()
+    return results
+
+# Function to benchmark batched prompts.
+def bench_openai(quick=False, repeat=3):
+    """
+    A batch of prompts against the mock OpenAI server with 50ms latency,
+    one at a time versus OpenAIClient.complete_many, and the wait for a
+    whole answer versus its first streamed token.
+    """
+    import ask_openai
+    from mock_openai import MockOpenAI
+
+    prompts = [f'prompt number {number}' for number in range(8 if quick else 32)]
+    completions = MockOpenAI(latency=0.05).start()
+    client = ask_openai.OpenAIClient('sk-bench', api_base=completions.api_base, cache=None)
+
+    sequential = time_call(lambda: [client.complete(prompt) for prompt in prompts], repeat)
+    batch = time_call(lambda: client.complete_many(prompts), repeat)
+
+    # Time to the first streamed word of a 100 word answer, 5ms per word
+    completions.token_latency = 0.005
+    essay = ' '.join(prompts * 4)[:600]
+    whole = time_call(lambda: client.complete(essay), repeat)
+    first = time_call(lambda: next(client.stream(essay)), repeat)
+    completions.stop()
+
+    return [summarize('ask.sequential', str(len(prompts)), sequential, len(prompts)),
+            summarize('ask.batch', str(len(prompts)), batch, len(prompts),
+                speedup=min(sequential) / min(batch)),
+            summarize('ask.whole_answer', 'streamed', whole),
+            summarize('ask.first_token', 'streamed', first, speedup=min(whole) / min(first))]
+
+# Function to benchmark process startup.
+def bench_startup(quick=False, repeat=3):
+    """
+    Fresh interpreters importing ask_openai and telegram_bot, and whole
+    ask_openai.py --model runs answered from the response cache or the
+    mock OpenAI server.
+    """
+    from mock_openai import MockOpenAI
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    completions = MockOpenAI().start()
+
+    with tempfile.TemporaryDirectory() as home:
+        with open(os.path.join(home, '.netrc'), 'w', encoding='utf-8') as netrcfile:
+            netrcfile.write('machine openai login api_key password sk-bench\n')
+        os.chmod(os.path.join(home, '.netrc'), 0o600)
+        env = {**os.environ, 'HOME': home, 'TMPDIR': home, 'PYTHONPATH': here,
+               'OPENAI_API_BASE': completions.api_base}
+
+        def run(*args):
+            subprocess.run([sys.executable, *args], cwd=home, env=env, check=True,
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        for module in ('ask_openai', 'telegram_bot'):
+            results.append(summarize('startup.import', module,
+                time_call(lambda: run('-c', f'import {module}'), repeat)))
+
+        cli = [os.path.join(here, 'ask_openai.py'), '--model', 'text-davinci-002', 'startup benchmark']
+        run(*cli)
+        results.append(summarize('startup.cli', 'cached', time_call(lambda: run(*cli), repeat)))
+        results.append(summarize('startup.cli', 'mock',
+            time_call(lambda: run(*cli, '--no-cache'), repeat)))
+
+    completions.stop()
+    return results
+
+# Function to benchmark the rot13 codec.
+def bench_rot32(quick=False, repeat=3):
+    """
+    rot32 throughput in MB/s: the old print-per-character loop on a 1MB
+    sample, then in-memory, chunked and multiprocess memory-mapped
+    translation of a larger log file.
+    """
+    import io
+    import contextlib
+    import rot32
+
+    megabytes = 16 if quick else 256
+    line = b'2023-01-03 09:30:00 INFO Fetching data for AAPL 15m-14d (caf\xc3\xa9)\n'
+    data = line * (megabytes * 2**20 // len(line))
+    sample = data[:2**20].decode()
+    workers = min(os.cpu_count() or 1, 4)
+
+    # The implementation rot32.rot32() had before the streaming engine
+    def legacy(string):
+        for character in string:
+            ord_val = ord(character.lower())
+            if not chr(ord_val).isalpha():
+                print(character, end='')
+            elif ord_val <= 109:
+                print(chr(ord_val + 13), end='')
+            else:
+                print(chr(ord_val - 13), end='')
+
+    results = []
+    with tempfile.TemporaryDirectory() as root, open(os.devnull, 'wb') as devnull:
+        path = os.path.join(root, 'sample.log')
+        with open(path, 'wb') as logfile:
+            logfile.write(data)
+        case = f'{megabytes}MB'
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(summarize('rot32.legacy', '1MB', time_call(lambda: legacy(sample), 1), 1))
+        results.append(summarize('rot32.memory', case,
+            time_call(lambda: rot32.transform(data), repeat), megabytes))
+        results.append(summarize('rot32.file', case,
+            time_call(lambda: rot32.transform_file(path, devnull), repeat), megabytes))
+        results.append(summarize('rot32.parallel', f'{case}/{workers}p', time_call(
+            lambda: rot32.transform_file(path, devnull, workers=workers, split_size=4 * 2**20),
+            repeat), megabytes))
+    return results
+
+# Benchmarks to run, in order
+BENCHMARKS = {
+    'load': bench_load,
+    'indicators': bench_indicators,
+    'candlestick': bench_candlestick,
+    'render': bench_render,
+    'commands': bench_commands,
+    'openai': bench_openai,
+    'startup': bench_startup,
+    'rot32': bench_rot32,
+    'scan': bench_scan,
+}
+
+# Function to compare results with a baseline.
+def regressions(results, baseline, threshold=0.2):
+    """
+    Return (result, baseline_result) pairs whose p50 is more than threshold
+    slower than the baseline.
+    """
+    saved = {(item['benchmark'], item['case']): item for item in baseline.get('results', [])}
+    slower = []
+    for result in results:
+        before = saved.get((result['benchmark'], result['case']))
+        if 'error' in result and before and 'error' not in before:
+            slower.append((result, before))
+        elif before and 'p50_ms' in before and 'error' not in result and result['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            slower.append((result, before))
+    return slower
+
+if __name__ == "__main__":
+    # Set environment basename for output files
+    basename = os.path.splitext(os.path.basename(__file__))[0]
+
+    # Initialize logging
+    logging.basicConfig(level=logging.WARNING,
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    parser = argparse.ArgumentParser(prog=basename, description=__doc__.split('\n\n')[0])
+    parser.add_argument('benchmarks', nargs='*', choices=[[]] + list(BENCHMARKS),
+        help='benchmarks to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='run the small case matrix')
+    parser.add_argument('--output', default=f'{basename}_results.json', help='results JSON file')
+    parser.add_argument('--baseline', help='baseline JSON file to compare against')
+    parser.add_argument('--save-baseline', metavar='FILE', help='also save results as a baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+        help='allowed p50 slowdown before flagging a regression (default 0.2)')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.benchmarks or list(BENCHMARKS):
+        func = BENCHMARKS[name]
+        found = func(quick=args.quick)
+        for result in found:
+            if 'error' in result:
+                print(f"{result['benchmark']:<26} {result['case']:<8} FAILED: {result['error']}")
+                continue
+            print(f"{result['benchmark']:<26} {result['case']:<8} "
+                f"p50={result['p50_ms']:9.2f}ms p99={result['p99_ms']:9.2f}ms "
+                f"{result['throughput_per_s']:12.1f}/s"
+                + (f" {result['bytes'] / 1024:9.0f}KB" if 'bytes' in result else ''))
+        results.extend(found)
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+        'machine': platform.machine(), 'results': results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as outfile:
+            json.dump(report, outfile, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as infile:
+            slower = regressions(results, json.load(infile), args.threshold)
+        for result, before in slower:
+            after = f"{result['p50_ms']:.2f}ms" if 'p50_ms' in result else result['error']
+            print(f"REGRESSION {result['benchmark']} {result['case']}: "
+                f"{before['p50_ms']:.2f}ms -> {after}")
+        sys.exit(1 if slower else 0)
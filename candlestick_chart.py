@@ -4,69 +4,272 @@ Python functions to create various stock analaysis charts.
 """
 
 # Import packages
+import io
 import os
 import logging
-from datetime import datetime
 import pandas
 import numpy
-import yfinance
 from matplotlib import pyplot
-from mplfinance.original_flavor import candlestick_ohlc
+from matplotlib.collections import LineCollection, PolyCollection
 
-# Function to create a candlestick_ohlc base chart using mplfinance.
+# Local imports
+import indicators
+import downsampling
+import tracing
+from metadata_cache import TickerMetadataCache
+from output_profiles import OUTPUT_PROFILES
+from chart_options import OVERLAY_TITLES, parse_overlays
+
+# Ticker names for chart titles, persisted across runs
+METADATA = TickerMetadataCache()
+
+# Output pixels per candle (body and wick) or overlay line vertex
+PIXELS_PER_BAR = 3
+
+# Figure width in inches of every chart
+FIGURE_WIDTH = 12
+
+# Function to size the downsampling to the output image.
+def point_budget(ax, dpi=600):
+    """Most candles or line vertices that stay distinct across ax saved at dpi."""
+    inches = ax.get_position().width * ax.figure.get_figwidth()
+    return max(int(inches * dpi / PIXELS_PER_BAR), 3)
+
+# Function to reduce overlay lines to the output width.
+def line_points(xaxis, *series, **kwargs):
+    """
+    Reduce lines sharing xaxis to about budget points each with LTTB. The
+    union of the picks is applied to every line, so bands between two of
+    them can still be filled.
+    """
+
+    # keywords & vars
+    budget = kwargs.get('budget')
+
+    if budget is None or len(xaxis) <= budget:
+        return xaxis, series
+    keep = numpy.unique(numpy.concatenate(
+        [downsampling.line_indices(values, budget, xaxis) for values in series]))
+    return xaxis[keep], [indicators.as_array(values)[keep] for values in series]
+
+# Function to draw candlesticks as two collections.
+def candlestick_collections(ax, xaxis, opens, highs, lows, closes, **kwargs):
+    """
+    Draws every candle body as one PolyCollection and every wick as one
+    LineCollection, styled like mplfinance's candlestick_ohlc.
+    """
+
+    # keywords & vars
+    width     = kwargs.get('width', 0.55)
+    colorup   = kwargs.get('colorup', 'green')
+    colordown = kwargs.get('colordown', 'red')
+
+    xaxis, opens, highs, lows, closes = (indicators.as_array(values)
+        for values in (xaxis, opens, highs, lows, closes))
+
+    # Skip bars with missing prices, as candlestick_ohlc ends up doing
+    valid = numpy.isfinite(opens) & numpy.isfinite(highs) & numpy.isfinite(lows) & numpy.isfinite(closes)
+    xaxis, opens, highs, lows, closes = (values[valid]
+        for values in (xaxis, opens, highs, lows, closes))
+
+    colors = numpy.where(closes >= opens, colorup, colordown)
+    bottom = numpy.minimum(opens, closes)
+    top = numpy.maximum(opens, closes)
+    left = xaxis - width / 2
+    right = xaxis + width / 2
+
+    # (n, 4, 2) rectangle corners and (n, 2, 2) low-high segments
+    bodies = numpy.stack([
+        numpy.column_stack([left, bottom]),
+        numpy.column_stack([left, top]),
+        numpy.column_stack([right, top]),
+        numpy.column_stack([right, bottom]),
+    ], axis=1)
+    wicks = numpy.stack([
+        numpy.column_stack([xaxis, lows]),
+        numpy.column_stack([xaxis, highs]),
+    ], axis=1)
+
+    wick_collection = LineCollection(wicks, colors=colors, linewidths=0.5,
+        antialiaseds=True, zorder=2)
+    body_collection = PolyCollection(bodies, facecolors=colors, edgecolors=colors,
+        linewidths=pyplot.rcParams['patch.linewidth'], zorder=1)
+
+    ax.add_collection(wick_collection)
+    ax.add_collection(body_collection)
+    ax.autoscale_view()
+
+    return wick_collection, body_collection
+
+# Function to get the bar timestamps.
+def bar_times(dataframe):
+    """
+    Exchange-local wall-clock times of the bars as a datetime64[ns] array,
+    from the Datetime or Date column (timestamps or CSV strings) or the index.
+    """
+    if 'Datetime' in dataframe:
+        times = dataframe['Datetime']
+    elif 'Date' in dataframe:
+        times = dataframe['Date']
+    else:
+        times = dataframe.index.to_series()
+
+    # Strings read back from CSV: drop the UTC offset and parse in one pass
+    if not pandas.api.types.is_datetime64_any_dtype(times):
+        times = pandas.to_datetime(times.astype(str).str.slice(0, 19))
+    elif times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+    return times.to_numpy(dtype='datetime64[ns]')
+
+# Function to place date ticks on a candlestick axes.
+def date_ticks(ax, times, **kwargs):
+    """
+    Sets about ticks_per_inch x-ticks per inch of axes width, on day
+    boundaries for multi-day intraday charts, and formats labels only for
+    the bars that get a tick.
+    """
+
+    # keywords & vars
+    fontsize       = kwargs.get('fontsize', 8)
+    ticks_per_inch = kwargs.get('ticks_per_inch', 0.8)
+
+    bars = len(times)
+    if not bars:
+        return ax
+    inches = ax.get_position().width * ax.figure.get_figwidth()
+    count = max(int(inches * ticks_per_inch), 2)
+
+    # Index of the first bar of every calendar day
+    days = times.astype('datetime64[D]')
+    starts = numpy.flatnonzero(numpy.concatenate([[True], days[1:] != days[:-1]]))
+
+    if len(starts) == bars:
+        # Daily or longer bars
+        positions = numpy.unique(numpy.linspace(0, bars - 1, count).round().astype(int))
+        fmt = '%Y-%m-%d'
+    elif len(starts) * 2 >= count:
+        # Intraday bars over many days, ticked at session opens
+        positions = starts[::-(-len(starts) // count)]
+        fmt = '%Y-%m-%d\n%A'
+    else:
+        # Intraday bars within a few days
+        positions = numpy.unique(numpy.linspace(0, bars - 1, count).round().astype(int))
+        fmt = '%m-%d\n%H:%M'
+
+    labels = pandas.DatetimeIndex(times[positions]).strftime(fmt)
+    ax.set_xticks(positions, labels, fontsize=fontsize, rotation=45)
+    return ax
+
+# Function to draw a candlestick chart on an existing axes.
+def draw_candlestick_panel(ax, dataframe, **kwargs):
+    """
+    Draws the title, date ticks, candlesticks and interval/period note of a
+    candlestick chart onto ax. With downsample, bars are merged into as
+    many candles as fit the axes width when saved at dpi.
+    """
+
+    # keywords & vars
+    title      = kwargs.get('title', '')
+    interval   = kwargs.get('interval', 'NaN')
+    period     = kwargs.get('period', 'NaN')
+    fontsize   = kwargs.get('fontsize', 8)
+    dpi        = kwargs.get('dpi', 600)
+    downsample = kwargs.get('downsample', True)
+
+    ax.set_title(title, loc='left')
+    date_ticks(ax, bar_times(dataframe), fontsize=fontsize)
+    ax.yaxis.tick_right()
+
+    # Merge bars that would share pixels into one candle each, before any artist exists
+    xaxis = numpy.arange(len(dataframe))
+    width = 0.55
+    prices = [dataframe["Open"], dataframe["High"], dataframe["Low"], dataframe["Close"]]
+    if downsample and len(dataframe) > point_budget(ax, dpi):
+        buckets = downsampling.ohlc_buckets(*prices, point_budget(ax, dpi))
+        xaxis = buckets['start'] + (buckets['count'] - 1) / 2
+        width = 0.55 * buckets['count']
+        prices = [buckets['Open'], buckets['High'], buckets['Low'], buckets['Close']]
+
+    # Create the candlestick chart
+    candlestick_collections(ax, xaxis, *prices,
+        width = width,
+        colorup = "green",
+        colordown = "red"
+    )
+
+    ax.text(0.01, 0.04, f'interval: {interval}\nperiod: {period}',
+        transform=ax.transAxes, fontsize=6, color='gray', alpha=0.5,
+        ha='left', va='bottom')
+
+    return ax
+
+# Function to create a candlestick base chart.
 def graph_candlestick(dataframe, **kwargs):
     """
-    Graphs a candlestick_ohlc chart using mplfinance.
+    Graphs a candlestick chart using batched matplotlib collections. dpi is
+    the resolution the chart will be saved at, which bounds how many
+    candles are drawn unless downsample=False.
     """
 
     # keywords & vars
     symbol = kwargs.get('symbol', '')
     interval = kwargs.get('interval', 'NaN')
     period = kwargs.get('period', 'NaN')
+    dpi = kwargs.get('dpi', 600)
+    downsample = kwargs.get('downsample', True)
 
-    name = yfinance.Ticker(symbol).info['shortName']
+    name = kwargs.get('name') or METADATA.short_name(symbol)
 
-    xdate = [datetime.strptime(x[:-6],
-        '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d\n%A') for x in dataframe.Datetime]
-
-    pyplot.figure(figsize=(12,3), dpi=80)
+    pyplot.figure(figsize=(FIGURE_WIDTH,3), dpi=80)
     pyplot.style.use('bmh')
-    pyplot.title(f'{symbol} - {name}', loc='left')
-
-    pyplot.xticks(numpy.arange(0, len(dataframe), step=28), xdate[::28], fontsize=8, rotation=45)
 
     #pyplot.xlabel('Date', fontsize=6)
     #pyplot.ylabel('Price', fontsize=6, color='grey')
 
     ax1 = pyplot.subplot(1,1,1)
-    ax1.yaxis.tick_right()
-
-    #Create a new DataFrame which includes OHLC data for each period specified by stick input
-    plotdata = pandas.DataFrame(
-        {
-            "Open":dataframe["Open"],
-            "High":dataframe["High"],
-            "Low":dataframe["Low"],
-            "Close":dataframe["Close"]
-        }
-    )
+    draw_candlestick_panel(ax1, dataframe,
+        title=f'{symbol} - {name}' if name != symbol else symbol,
+        interval=interval, period=period, dpi=dpi, downsample=downsample)
 
-    # Create the candelstick chart
-    candlestick_ohlc(ax1, list(zip(list(plotdata.index.tolist()),
-            plotdata["Open"].tolist(),
-            plotdata["High"].tolist(),
-            plotdata["Low"].tolist(),
-            plotdata["Close"].tolist()
-        )),
-        width = 0.55,
-        colorup = "green",
-        colordown = "red"
-    )
+    return pyplot
 
-    ax1.text(0.01, 0.04, f'interval: {interval}\nperiod: {period}',
-        transform=ax1.transAxes, fontsize=6, color='gray', alpha=0.5,
-        ha='left', va='bottom')
+# Function to create a small-multiples grid of candlestick charts.
+def graph_candlestick_grid(frames, **kwargs):
+    """
+    Graphs one candlestick panel per symbol of frames ({symbol: dataframe})
+    in a single figure, with optional overlays ('vwap', 'bollinger+vwap',
+    ...) drawn on every panel.
+    Style, figure and axes are set up once for the whole grid.
+    """
 
+    # keywords & vars
+    interval = kwargs.get('interval', 'NaN')
+    period   = kwargs.get('period', 'NaN')
+    overlay  = kwargs.get('chart')
+    columns  = min(kwargs.get('columns', 2), len(frames))
+    names    = kwargs.get('names', {})
+    dpi        = kwargs.get('dpi', 600)
+    downsample = kwargs.get('downsample', True)
+
+    rows = -(-len(frames) // columns)
+    pyplot.style.use('bmh')
+    fig, axes = pyplot.subplots(rows, columns, figsize=(FIGURE_WIDTH, 3 * rows), dpi=80,
+        squeeze=False)
+
+    for ax, (symbol, dataframe) in zip(axes.flat, frames.items()):
+        name = names.get(symbol) or METADATA.short_name(symbol)
+        draw_candlestick_panel(ax, dataframe,
+            title=f'{symbol} - {name}' if name != symbol else symbol,
+            interval=interval, period=period, fontsize=6, dpi=dpi, downsample=downsample)
+        if overlay is not None:
+            pyplot.sca(ax)
+            overlay_chart(dataframe, overlay, dpi=dpi, downsample=downsample)
+
+    # Hide panels left over in the last row
+    for ax in axes.flat[len(frames):]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
     return pyplot
 
 # Function to create a Bollinger Bands overlay chart
@@ -80,24 +283,29 @@ def overlay_bollinger(dataframe, **kwargs):
     # keywords & vars
     num_of_std  = kwargs.get('num_of_std', 2)
     window_size = kwargs.get('window_size', 20)
+    dpi         = kwargs.get('dpi', 600)
+    downsample  = kwargs.get('downsample', True)
+    graph       = kwargs.get('graph') or indicators.IndicatorGraph(dataframe)
 
     # plot chart type in title
-    pyplot.title('Bollinger Bands', loc='right', fontsize=6, color='darkblue')
+    pyplot.title(OVERLAY_TITLES['bollinger'], loc='right', fontsize=6, color='darkblue')
 
-    # create rolling mean and standard deviation
-    rolling_mean = dataframe['Close'].rolling(window=window_size).mean()
-    rolling_std = dataframe['Close'].rolling(window=window_size).std()
+    # create rolling mean and upper and lower bands
+    with tracing.span('indicators.bollinger'):
+        rolling_mean, upper_band, lower_band = graph.bollinger(
+            num_of_std=num_of_std, window_size=window_size)
 
-    # create upper and lower bands
-    upper_band = rolling_mean + (rolling_std * num_of_std)
-    lower_band = rolling_mean - (rolling_std * num_of_std)
+    # Reduce the lines to the output width
+    budget = point_budget(pyplot.gca(), dpi) if downsample else None
+    xaxis, (rolling_mean, upper_band, lower_band) = line_points(
+        numpy.arange(len(rolling_mean)), rolling_mean, upper_band, lower_band, budget=budget)
 
     # plot stock data, rolling mean and Bollinger Bands
-    pyplot.plot(rolling_mean, label='Rolling Mean', linewidth=0.5, linestyle='dashed', color='gray')
-    pyplot.plot(upper_band, label='Upper band', linewidth=0.5, color='blue')
-    pyplot.plot(lower_band, label='Lower band', linewidth=0.5, color='purple')
+    pyplot.plot(xaxis, rolling_mean, label='Rolling Mean', linewidth=0.5, linestyle='dashed', color='gray')
+    pyplot.plot(xaxis, upper_band, label='Upper band', linewidth=0.5, color='blue')
+    pyplot.plot(xaxis, lower_band, label='Lower band', linewidth=0.5, color='purple')
 
-    pyplot.fill_between(dataframe.index,
+    pyplot.fill_between(xaxis,
         upper_band, lower_band,
         where=upper_band > lower_band,
         color='lightgrey', alpha=0.2)
@@ -120,45 +328,43 @@ def overlay_ichimoku(dataframe, **kwargs):
     tenkan   = kwargs.get('tenkan', 9)
     kijun    = kwargs.get('kijun', 26)
     senkou_b = kwargs.get('senkou_b', 52)
+    dpi        = kwargs.get('dpi', 600)
+    downsample = kwargs.get('downsample', True)
+    graph      = kwargs.get('graph') or indicators.IndicatorGraph(dataframe)
 
     # Plot chart type in title
-    pyplot.title('Ichimoku Kinko Hyo', loc='right', fontsize=6, color='darkblue')
-
-    # Append null row at the end of the dataframe
-    dataframe = pandas.concat([dataframe, pandas.DataFrame(numpy.zeros((senkou_b,
-        len(dataframe.columns))))]).reset_index(drop=True)
-
-    # Calculate ichimoku data
-    dataframe['Tenkan_sen']  = (dataframe['High'].rolling(tenkan).max() + \
-            dataframe['Low'].rolling(tenkan).min()) / 2
-    dataframe['Kijun_sen']   = (dataframe['High'].rolling(kijun).max() + \
-            dataframe['Low'].rolling(kijun).min()) / 2
-    dataframe['Senkou_a']    = ((dataframe['Tenkan_sen'] + \
-            dataframe['Kijun_sen']) / 2).shift(senkou_b)
-    dataframe['Senkou_b']    = ((dataframe['High'].rolling(senkou_b).max() + \
-            dataframe['Low'].rolling(senkou_b).min()) / 2).shift(senkou_b)
-    dataframe['Chikou_span'] = dataframe['Close'].shift(-26)
+    pyplot.title(OVERLAY_TITLES['ichimoku'], loc='right', fontsize=6, color='darkblue')
+
+    # Calculate ichimoku data, projected senkou_b bars past the last close
+    with tracing.span('indicators.ichimoku'):
+        lines = graph.ichimoku(tenkan=tenkan, kijun=kijun, senkou_b=senkou_b)
+
+    # Reduce the lines to the output width
+    budget = point_budget(pyplot.gca(), dpi) if downsample else None
+    xaxis, reduced = line_points(numpy.arange(len(lines['Senkou_a'])),
+            *lines.values(), budget=budget)
+    lines = dict(zip(lines, reduced))
 
     # Plot the Ichimoku chart
-    pyplot.plot(dataframe['Tenkan_sen'], label='Tenkan-sen',
+    pyplot.plot(xaxis, lines['Tenkan_sen'], label='Tenkan-sen',
             linewidth=0.4, color='darkorange')
-    pyplot.plot(dataframe['Kijun_sen'], label='Kijun-Sen',
+    pyplot.plot(xaxis, lines['Kijun_sen'], label='Kijun-Sen',
             linewidth=0.4, color='purple')
-    pyplot.plot(dataframe['Senkou_a'], label='Senkou Span A',
+    pyplot.plot(xaxis, lines['Senkou_a'], label='Senkou Span A',
             linewidth=0.4, alpha=0.05, color='grey')
-    pyplot.plot(dataframe['Senkou_b'], label='Senkou Span B',
+    pyplot.plot(xaxis, lines['Senkou_b'], label='Senkou Span B',
             linewidth=0.6, color='red')
-    pyplot.plot(dataframe['Chikou_span'], label='Chikou Span',
+    pyplot.plot(xaxis, lines['Chikou_span'], label='Chikou Span',
             linewidth=1, linestyle='dashed', alpha=0.5, color='cyan')
 
     # Plot Kumo (Cloud)
-    pyplot.fill_between(dataframe.index,
-        dataframe['Senkou_a'], dataframe['Senkou_b'],
-        where=dataframe['Senkou_a'] >= dataframe['Senkou_b'],
+    pyplot.fill_between(xaxis,
+        lines['Senkou_a'], lines['Senkou_b'],
+        where=lines['Senkou_a'] >= lines['Senkou_b'],
         color='grey', alpha=0.2)
-    pyplot.fill_between(dataframe.index,
-        dataframe['Senkou_a'], dataframe['Senkou_b'],
-        where=dataframe['Senkou_a'] < dataframe['Senkou_b'],
+    pyplot.fill_between(xaxis,
+        lines['Senkou_a'], lines['Senkou_b'],
+        where=lines['Senkou_a'] < lines['Senkou_b'],
         color='orange', alpha=0.2)
 
     # Show legend on the plot
@@ -167,27 +373,130 @@ def overlay_ichimoku(dataframe, **kwargs):
     return pyplot
 
 # Function to create a VWAP overlay chart.
-def overlay_vwap(dataframe):
+def overlay_vwap(dataframe, **kwargs):
     """
     VWAP represents the average price a security has traded at throughout the day,
     based on both volume and price.
     """
 
+    # keywords & vars
+    dpi        = kwargs.get('dpi', 600)
+    downsample = kwargs.get('downsample', True)
+    graph      = kwargs.get('graph') or indicators.IndicatorGraph(dataframe)
+
     # plot chart type in title
-    pyplot.title('Volume-Weighted Average Price', loc='right', fontsize=6, color='darkblue')
+    pyplot.title(OVERLAY_TITLES['vwap'], loc='right', fontsize=6, color='darkblue')
 
-    # create VWAP column
-    dataframe['VWAP'] = (dataframe['Close'] * dataframe['Volume']).cumsum() \
-                            / dataframe['Volume'].cumsum()
+    # create VWAP series
+    with tracing.span('indicators.vwap'):
+        vwap = graph.vwap()
 
-    # plot VWAP data
-    pyplot.plot(dataframe['VWAP'], label='VWAP', linewidth=0.8, color='blue')
+    # plot VWAP data, reduced to the output width
+    budget = point_budget(pyplot.gca(), dpi) if downsample else None
+    xaxis, (vwap,) = line_points(numpy.arange(len(vwap)), vwap, budget=budget)
+    pyplot.plot(xaxis, vwap, label='VWAP', linewidth=0.8, color='blue')
 
     # Show legend on the plot
     pyplot.legend(loc='upper left', fontsize=6)
 
     return pyplot
 
+# Overlays selectable by name
+OVERLAYS = {
+    'bollinger': overlay_bollinger,
+    'ichimoku': overlay_ichimoku,
+    'vwap': overlay_vwap,
+}
+
+# Function to draw one or more overlays.
+def overlay_chart(dataframe, chart, **kwargs):
+    """
+    Draws every overlay of chart ('vwap', 'bollinger+ichimoku', ...) on the
+    current axes. The overlays share one IndicatorGraph, so intermediates
+    they have in common are computed once.
+    """
+    names = parse_overlays(chart)
+    if names is None:
+        raise ValueError(f"Unknown chart: {chart}")
+
+    kwargs.setdefault('graph', indicators.IndicatorGraph(dataframe))
+    for name in names:
+        OVERLAYS[name](dataframe, **kwargs)
+
+    # One title naming every overlay
+    pyplot.title(' + '.join(OVERLAY_TITLES[name] for name in names),
+        loc='right', fontsize=6, color='darkblue')
+    return pyplot
+
+# Function to look up an output profile.
+def output_profile(profile):
+    """Settings of a named output profile, or of a profile dict given as is."""
+    return OUTPUT_PROFILES[profile] if isinstance(profile, str) else profile
+
+# Function to size the output to a profile.
+def output_dpi(profile):
+    """Dots per inch that make a chart the profile's width in pixels."""
+    profile = output_profile(profile)
+    return profile.get('dpi') or profile['width'] / FIGURE_WIDTH
+
+# Function to encode the current figure.
+def encode_image(graph, profile='archive'):
+    """Save the current pyplot figure as an output profile's image bytes and close it."""
+    profile = output_profile(profile)
+    buffer = io.BytesIO()
+    with tracing.span('render.savefig'):
+        graph.savefig(buffer, format=profile['format'], dpi=output_dpi(profile),
+            bbox_inches='tight', pad_inches=0.1, pil_kwargs=dict(profile.get('options', {})))
+    graph.close()
+    return buffer.getvalue()
+
+# Function to encode the current figure as PNG.
+def encode_png(graph, dpi=600):
+    """Save the current pyplot figure to PNG bytes and close it."""
+    return encode_image(graph, {'dpi': dpi, 'format': 'png'})
+
+# Function to render a chart straight to image bytes.
+def render_image(dataframe, **kwargs):
+    """
+    Renders a candlestick chart with the named overlays and returns it
+    encoded by the output profile, without touching the filesystem.
+    """
+
+    # keywords & vars
+    overlay = kwargs.pop('chart', 'vwap')
+    profile = kwargs.pop('profile', 'archive')
+
+    dpi = output_dpi(profile)
+    with tracing.span('render.candlestick'):
+        graph = graph_candlestick(dataframe, dpi=dpi, **kwargs)
+    with tracing.span('render.overlay'):
+        graph = overlay_chart(dataframe, overlay, dpi=dpi,
+            downsample=kwargs.get('downsample', True))
+    return encode_image(graph, profile)
+
+# Function to render a grid of charts straight to image bytes.
+def render_grid_image(frames, **kwargs):
+    """Renders graph_candlestick_grid for {symbol: dataframe} as profile image bytes."""
+
+    # keywords & vars
+    profile = kwargs.pop('profile', 'archive')
+
+    with tracing.span('render.grid'):
+        graph = graph_candlestick_grid(frames, dpi=output_dpi(profile), **kwargs)
+    return encode_image(graph, profile)
+
+# Function to render a chart straight to PNG bytes.
+def render_png(dataframe, **kwargs):
+    """render_image() as a PNG at dpi."""
+    dpi = kwargs.pop('dpi', 600)
+    return render_image(dataframe, profile={'dpi': dpi, 'format': 'png'}, **kwargs)
+
+# Function to render a grid of charts straight to PNG bytes.
+def render_grid_png(frames, **kwargs):
+    """render_grid_image() as a PNG at dpi."""
+    dpi = kwargs.pop('dpi', 600)
+    return render_grid_image(frames, profile={'dpi': dpi, 'format': 'png'}, **kwargs)
+
 if __name__ == "__main__":
     # Set environment basename for output files
     basename = os.path.splitext(os.path.basename(__file__))[0]
@@ -207,6 +516,7 @@ if __name__ == "__main__":
     # Read historical data from Yahoo Finance
     csvfile = os.path.expanduser(f'~/public_html/{basename}.csv')
     if not os.path.exists(csvfile):
+        import yfinance
         df = yfinance.download(SYMBOL, interval=INTERVAL, period=PERIOD)
         df.to_csv(csvfile)
 
@@ -221,5 +531,5 @@ if __name__ == "__main__":
 
     # Save the plot to a PNG file
     pngfile = os.path.expanduser(f'~/public_html/{basename}.png')
-    graph.savefig(pngfile, dpi=600, bbox_inches='tight', pad_inches=0.1)
-    graph.close()
+    with open(pngfile, 'wb') as imagefile:
+        imagefile.write(encode_image(graph, 'archive'))
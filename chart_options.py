@@ -0,0 +1,33 @@
+#!/bin/env -S python3
+"""
+What a /chart request may ask for: ticker symbols, intervals, periods and
+overlays. Kept apart from candlestick_chart so that requests and watchlist
+entries can be checked without loading matplotlib.
+"""
+
+import re
+
+# Ticker symbols, e.g. AAPL, BRK-B, ^GSPC, EURUSD=X
+SYMBOL_PATTERN = re.compile(r'[A-Z0-9^][A-Z0-9.^=-]{0,14}')
+
+# Intervals and periods /chart accepts
+INTERVALS = ['1m', '5m', '15m', '30m', '1h', '1d']
+PERIODS = ['1d', '7d', '14d', '1w', '1m', '3m', '1y']
+
+# Titles of the overlays, joined with ' + ' when several are drawn
+OVERLAY_TITLES = {
+    'bollinger': 'Bollinger Bands',
+    'ichimoku': 'Ichimoku Kinko Hyo',
+    'vwap': 'Volume-Weighted Average Price',
+}
+
+# Function to parse a composite chart name.
+def parse_overlays(chart):
+    """
+    Overlay names of a chart such as 'bollinger+vwap', in order and without
+    repeats, or None if any of them is unknown.
+    """
+    names = list(dict.fromkeys(name for name in chart.lower().split('+') if name))
+    if not names or any(name not in OVERLAY_TITLES for name in names):
+        return None
+    return names
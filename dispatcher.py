@@ -0,0 +1,155 @@
+#!/bin/env -S python3
+"""
+Concurrent bot command execution.
+
+Commands from one chat run in the order they arrived, while different chats
+run side by side on a thread pool sized for I/O (yfinance, OpenAI, Telegram
+uploads). Matplotlib rendering is shipped to a pool of warm worker processes
+that have the Agg backend and the chart module already imported.
+"""
+
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Local imports
+import tracing
+
+# Function to prepare a render worker process.
+def warm_renderer():
+    """Preload matplotlib with the Agg backend and the chart module."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    import candlestick_chart
+    pyplot.style.use('bmh')
+
+# Class to run bot commands concurrently.
+class ChatDispatcher:
+    """
+    Runs handlers concurrently across chats but one at a time per chat.
+
+    io_workers bounds the threads running handlers, render_workers the
+    processes rendering charts, and limits optionally caps how many of a
+    given kind of command (e.g. {'/ask': 2}) run at once. Commands over
+    their limit wait in a queue rather than on a pool thread, so they never
+    hold up other kinds of commands.
+    """
+
+    def __init__(self, **kwargs):
+        self.io_workers     = kwargs.get('io_workers', 16)
+        self.render_workers = kwargs.get('render_workers', 2)
+        self.limits         = kwargs.get('limits', {})
+        self.io_pool = ThreadPoolExecutor(max_workers=self.io_workers,
+            thread_name_prefix='dispatch')
+        self.render_pool = None
+        if self.render_workers:
+            # Workers start from a clean server process, not forked from one
+            # running the dispatch, prewarm and preload threads
+            self.render_pool = ProcessPoolExecutor(max_workers=self.render_workers,
+                initializer=warm_renderer, mp_context=multiprocessing.get_context('forkserver'))
+        # pyplot's current figure is global, so inline renders take turns
+        self.render_lock = threading.Lock()
+        # Guards the queues below and signals when every chat is done
+        self.lock = threading.Condition()
+        self.chats = {}
+        # Running and parked commands of each limited kind
+        self.running = {kind: 0 for kind in self.limits}
+        self.parked = {kind: deque() for kind in self.limits}
+
+    def submit(self, chat_id, kind, handler, *args, **kwargs):
+        """
+        Queue handler(*args, **kwargs) for chat_id. It starts once every
+        earlier command of that chat has finished.
+        """
+        job = (kind, handler, args, kwargs)
+        with self.lock:
+            if chat_id in self.chats:
+                self.chats[chat_id].append(job)
+                return
+            self.chats[chat_id] = deque()
+            job = self._admit(chat_id, job)
+        if job is not None:
+            self.io_pool.submit(self._run, chat_id, job)
+
+    def _admit(self, chat_id, job):
+        """
+        Take a slot of the job's kind and return the job, or park it until
+        a slot frees up and return None. Called with the lock held.
+        """
+        kind = job[0]
+        if kind in self.limits:
+            if self.running[kind] >= self.limits[kind]:
+                self.parked[kind].append((chat_id, job))
+                return None
+            self.running[kind] += 1
+        return job
+
+    def _run(self, chat_id, job):
+        """Run a job, then hand the thread to the chat's next queued job."""
+        while job is not None:
+            kind, handler, args, kwargs = job
+            try:
+                with tracing.span(f'command.{kind}'):
+                    handler(*args, **kwargs)
+            except BaseException:
+                # Including SystemExit, so the chat is always handed on
+                logging.exception("Command %s failed in chat %s", kind, chat_id)
+
+            resumed = None
+            with self.lock:
+                # Pass the freed slot to the longest parked command
+                if kind in self.limits:
+                    self.running[kind] -= 1
+                    if self.parked[kind]:
+                        resumed = self.parked[kind].popleft()
+                        self.running[kind] += 1
+                if self.chats[chat_id]:
+                    job = self._admit(chat_id, self.chats[chat_id].popleft())
+                else:
+                    del self.chats[chat_id]
+                    job = None
+                    if not self.chats:
+                        self.lock.notify_all()
+            if resumed is not None:
+                self.io_pool.submit(self._run, *resumed)
+
+    def render(self, func, *args, **kwargs):
+        """
+        Run func in a render worker process and wait for its result. Spans
+        recorded by the worker are merged into this process's tracer. Without
+        render workers, func runs in the calling thread, one render at a time.
+        """
+        if self.render_pool is None:
+            with self.render_lock:
+                return func(*args, **kwargs)
+        if not tracing.TRACER.enabled:
+            return self.render_pool.submit(func, *args, **kwargs).result()
+        result, spans = self.render_pool.submit(tracing.capture, func, *args, **kwargs).result()
+        tracing.TRACER.merge(spans)
+        return result
+
+    def map(self, func, *iterables):
+        """
+        list(map(func, *iterables)) spread over the render worker processes,
+        or run in the calling thread without them.
+        """
+        if self.render_pool is None:
+            return list(map(func, *iterables))
+        return list(self.render_pool.map(func, *iterables))
+
+    def pending(self):
+        """Number of chats with a command running or queued."""
+        with self.lock:
+            return len(self.chats)
+
+    def shutdown(self, wait=True):
+        """Wait for every queued and parked command, then stop the pools."""
+        if wait:
+            with self.lock:
+                self.lock.wait_for(lambda: not self.chats)
+        self.io_pool.shutdown(wait=wait)
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=wait)
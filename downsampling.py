@@ -0,0 +1,127 @@
+#!/bin/env -S python3
+"""
+Pure NumPy reducers that shrink long price histories to what a chart can
+show.
+
+ohlc_runs() merges runs of consecutive bars into one candle each (first
+open, highest high, lowest low, last close, summed volume), ohlc_buckets()
+does so over equal runs sized to a chart, and lttb() picks the points of a
+line that keep its visual shape with the Largest-Triangle-Three-Buckets
+algorithm. Inputs are never modified.
+"""
+
+import numpy
+
+# Local imports
+from indicators import as_array
+
+# Function to split bars into equal runs.
+def bucket_starts(length, buckets):
+    """First bar index of each of at most buckets equal runs of length bars."""
+    return numpy.unique(numpy.linspace(0, length, buckets + 1)[:-1].astype(numpy.int64))
+
+# Function to merge runs of bars into OHLC candles.
+def ohlc_runs(opens, highs, lows, closes, starts, volumes=None):
+    """
+    Aggregate the runs of bars beginning at the sorted indices starts into
+    one candle each. Returns a dict of arrays: 'start' and 'count' (first
+    bar and number of bars of each candle), 'last' (the bar the close was
+    taken from), 'Open', 'High', 'Low', 'Close' and, with volumes,
+    'Volume'. Bars with missing prices are skipped; a candle of only
+    missing bars is all NaN.
+    """
+    opens, highs, lows, closes = (as_array(values) for values in (opens, highs, lows, closes))
+    length = len(closes)
+    starts = numpy.asarray(starts, dtype=numpy.int64)
+    ends = numpy.append(starts[1:], length)
+
+    # First and last bar of each run that has an open and a close
+    priced = numpy.flatnonzero(numpy.isfinite(opens) & numpy.isfinite(closes))
+    first = numpy.searchsorted(priced, starts)
+    last = numpy.searchsorted(priced, ends) - 1
+    empty = first > last
+    first = priced[numpy.minimum(first, len(priced) - 1)] if len(priced) else starts
+    last = priced[numpy.maximum(last, 0)] if len(priced) else starts
+
+    result = {
+        'start': starts,
+        'count': ends - starts,
+        'last': numpy.where(empty, starts, last),
+        'Open': numpy.where(empty, numpy.nan, opens[first]),
+        'High': numpy.fmax.reduceat(highs, starts) if length else highs,
+        'Low': numpy.fmin.reduceat(lows, starts) if length else lows,
+        'Close': numpy.where(empty, numpy.nan, closes[last]),
+    }
+    if volumes is not None:
+        volumes = numpy.nan_to_num(as_array(volumes))
+        result['Volume'] = numpy.add.reduceat(volumes, starts) if length else volumes
+    return result
+
+# Function to merge bars into coarser OHLC candles.
+def ohlc_buckets(opens, highs, lows, closes, buckets, volumes=None):
+    """ohlc_runs() over at most buckets equal runs of bars."""
+    return ohlc_runs(opens, highs, lows, closes, bucket_starts(len(closes), buckets), volumes)
+
+# Function to pick the points that keep a line's shape.
+def lttb(x, y, threshold):
+    """
+    Indices of threshold points of the finite line (x, y) chosen in the
+    Largest-Triangle-Three-Buckets manner; every index if it is short
+    already. Each bucket keeps the point spanning the largest triangle with
+    the average points of its neighbouring buckets, which is LTTB with the
+    previous pick replaced by its bucket average so every bucket is
+    decided in one vectorized pass.
+    """
+    x, y = as_array(x), as_array(y)
+    length = len(y)
+    if threshold >= length or threshold < 3:
+        return numpy.arange(length)
+
+    # threshold - 2 buckets between the fixed first and last points
+    edges = numpy.linspace(1, length - 1, threshold - 1).astype(numpy.int64)
+    starts, counts = edges[:-1], numpy.diff(edges)
+    mean_x = numpy.add.reduceat(x, starts) / counts
+    mean_y = numpy.add.reduceat(y, starts) / counts
+    mean_x[-1] = x[edges[-2]:length - 1].mean()
+    mean_y[-1] = y[edges[-2]:length - 1].mean()
+
+    # Triangle corners on either side of every bucket
+    prev_x = numpy.concatenate([[x[0]], mean_x[:-1]])
+    prev_y = numpy.concatenate([[y[0]], mean_y[:-1]])
+    next_x = numpy.append(mean_x[1:], x[-1])
+    next_y = numpy.append(mean_y[1:], y[-1])
+
+    # Candidates as a (bucket, slot) grid padded with the bucket's first point
+    slots = numpy.arange(counts.max())
+    candidates = starts[:, None] + numpy.minimum(slots[None, :], counts[:, None] - 1)
+    area = numpy.abs((prev_x - next_x)[:, None] * (y[candidates] - prev_y[:, None])
+                     - (prev_x[:, None] - x[candidates]) * (next_y - prev_y)[:, None])
+
+    selected = numpy.empty(threshold, dtype=numpy.int64)
+    selected[0], selected[-1] = 0, length - 1
+    selected[1:-1] = candidates[numpy.arange(len(starts)), area.argmax(axis=1)]
+    return selected
+
+# Function to reduce a line with gaps.
+def line_indices(y, threshold, x=None):
+    """
+    LTTB indices of y over about threshold points, run separately on each
+    stretch of finite values. The first missing value after each stretch
+    is kept as well, so the reduced line still breaks at the gaps.
+    """
+    y = as_array(y)
+    x = numpy.arange(len(y), dtype=numpy.float64) if x is None else as_array(x)
+    finite = numpy.isfinite(y)
+    total = int(finite.sum())
+    if not total:
+        return numpy.empty(0, dtype=numpy.int64)
+
+    # (start, end) of every run of finite values
+    runs = numpy.flatnonzero(numpy.diff(numpy.concatenate([[0], finite.astype(numpy.int8), [0]])))
+    picks = []
+    for start, end in runs.reshape(-1, 2):
+        share = max(threshold * (end - start) // total, 3)
+        picks.append(start + lttb(x[start:end], y[start:end], share))
+        if end < len(y):
+            picks.append(numpy.array([end]))
+    return numpy.concatenate(picks)
@@ -0,0 +1,175 @@
+#!/bin/env -S python3
+"""
+Local fake of the Telegram Bot API for testing the bot offline.
+
+Point telegram.Bot at it with base_url=FakeBotAPI().base_url. Commands are
+injected with push_command() and every bot reply is recorded in sent.
+Run it directly to measure update throughput and pickup latency:
+$ fake_telegram.py [commands]
+"""
+
+import sys
+import json
+import time
+import email.parser
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Class to answer Bot API requests.
+class _Handler(BaseHTTPRequestHandler):
+    """Routes /bot<token>/<method> requests to the FakeBotAPI."""
+
+    def log_message(self, *args):
+        """Keep the console quiet."""
+
+    def do_POST(self):
+        """Parse a JSON, form or multipart body and dispatch the method."""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        ctype = self.headers.get('Content-Type', '')
+        if ctype.startswith('multipart/'):
+            message = email.parser.BytesParser().parsebytes(
+                f'Content-Type: {ctype}\r\n\r\n'.encode() + body)
+            params = {part.get_param('name', header='content-disposition'):
+                      part.get_payload(decode=True) for part in message.get_payload()}
+            params = {key: value.decode() if key not in ('photo', 'document') else value
+                      for key, value in params.items()}
+        elif body:
+            params = json.loads(body)
+        else:
+            params = {}
+
+        method = self.path.rsplit('/', 1)[-1]
+        result = self.server.api.call(method, params)
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST
+
+# Class to fake the Telegram Bot API.
+class FakeBotAPI:
+    """In-process Bot API serving getUpdates long polling and recording replies."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.condition = threading.Condition()
+        self.updates = []
+        self.pushed = {}
+        self.sent = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.thread = None
+
+    @property
+    def base_url(self):
+        """base_url for telegram.Bot."""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _message(self, chat_id, text=None, **fields):
+        """Build a Message dict."""
+        with self.condition:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+        message = {'message_id': message_id, 'date': int(time.time()),
+                   'chat': {'id': int(chat_id), 'type': 'private'},
+                   'from': {'id': int(chat_id), 'is_bot': False, 'first_name': 'Tester'}}
+        if text is not None:
+            message['text'] = text
+        message.update(fields)
+        return message
+
+    def push_command(self, chat_id, text):
+        """Queue a bot command from chat_id, returning its update_id."""
+        command = text.split(' ')[0]
+        message = self._message(chat_id, text,
+            entities=[{'type': 'bot_command', 'offset': 0, 'length': len(command)}])
+        with self.condition:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({'update_id': update_id, 'message': message})
+            self.pushed[update_id] = time.perf_counter()
+            self.condition.notify_all()
+        return update_id
+
+    def call(self, method, params):
+        """Answer one Bot API method."""
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        if method == 'getUpdates':
+            return self._get_updates(params)
+
+        reply = self._message(params.get('chat_id', 0), params.get('text'))
+        if 'message_id' in params:
+            reply['message_id'] = int(params['message_id'])
+        if method == 'sendPhoto':
+            reply['photo'] = []
+        with self.condition:
+            self.sent.append({'method': method, 'time': time.perf_counter(), **params})
+            self.condition.notify_all()
+        return reply
+
+    def _get_updates(self, params):
+        """Long poll: wait up to timeout for updates at or after offset."""
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        with self.condition:
+            # Updates before offset are acknowledged and forgotten
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return self.updates[:limit]
+
+# Function to measure update pickup latency and throughput.
+def bench_consumer(commands=1000, burst=50):
+    """
+    Push commands in bursts to a fake API and consume them with an
+    UpdateConsumer, returning latency percentiles and throughput.
+    """
+    import telegram
+    import numpy
+    from update_consumer import UpdateConsumer
+
+    api = FakeBotAPI().start()
+    bot = telegram.Bot(token='123456:FAKE', base_url=api.base_url)
+    consumer = UpdateConsumer(bot, timeout=5)
+    latencies = []
+
+    def pusher():
+        for index in range(commands):
+            api.push_command(1 + index % 7, f'/status {index}')
+            if index % burst == burst - 1:
+                time.sleep(0.01)
+
+    start = time.perf_counter()
+    threading.Thread(target=pusher, daemon=True).start()
+    while len(latencies) < commands:
+        for update in consumer.poll():
+            latencies.append(time.perf_counter() - api.pushed[update.update_id])
+    elapsed = time.perf_counter() - start
+    api.stop()
+
+    return {'updates': commands, 'updates_per_s': commands / elapsed,
+            'p50_ms': float(numpy.percentile(latencies, 50)) * 1000,
+            'p99_ms': float(numpy.percentile(latencies, 99)) * 1000}
+
+if __name__ == '__main__':
+    result = bench_consumer(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print(' '.join(f'{key}={value:.4g}' for key, value in result.items()))
@@ -0,0 +1,207 @@
+#!/bin/env -S python3
+"""
+Pure NumPy stock indicator functions.
+
+Every function takes contiguous float arrays (or anything numpy.asarray can
+view, such as a pandas Series) and returns new result arrays. Nothing is
+plotted and the inputs are never copied or modified. Rolling windows run
+along the last axis, so a (symbols x bars) array is computed in one pass.
+"""
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Function to view a series as a contiguous float array.
+def as_array(values):
+    """
+    Return values as a contiguous float64 array, without copying when the
+    data is already laid out that way.
+    """
+    return numpy.ascontiguousarray(values, dtype=numpy.float64)
+
+# Function to build a result array padded with leading NaNs.
+def _window_result(values, window, reduce):
+    """Apply reduce over every full window, NaN until the first one is full."""
+    values = as_array(values)
+    result = numpy.full(values.shape, numpy.nan)
+    if 0 < window <= values.shape[-1]:
+        result[..., window - 1:] = reduce(sliding_window_view(values, window, axis=-1))
+    return result
+
+# Function to calculate a rolling mean.
+def rolling_mean(values, window):
+    """Simple moving average over window bars."""
+    return _window_result(values, window, lambda view: view.mean(axis=-1))
+
+# Function to calculate a rolling standard deviation.
+def rolling_std(values, window):
+    """Sample (ddof=1) standard deviation over window bars."""
+    return _window_result(values, window, lambda view: view.std(axis=-1, ddof=1))
+
+# Function to calculate a rolling maximum.
+def rolling_max(values, window):
+    """Highest value over window bars."""
+    return _window_result(values, window, lambda view: view.max(axis=-1))
+
+# Function to calculate a rolling minimum.
+def rolling_min(values, window):
+    """Lowest value over window bars."""
+    return _window_result(values, window, lambda view: view.min(axis=-1))
+
+# Function to shift an array forward, growing it to length.
+def shift_forward(values, periods, length):
+    """
+    Return values displaced periods bars to the right inside an array of the
+    given length, NaN where no source value exists.
+    """
+    result = numpy.full(length, numpy.nan)
+    count = max(min(len(values), length - periods), 0)
+    result[periods:periods + count] = values[:count]
+    return result
+
+# Class to share indicator intermediates between overlays.
+class IndicatorGraph:
+    """
+    Memoized computation graph over one set of price columns (a DataFrame
+    or any mapping of High, Low, Close and Volume). Every intermediate,
+    such as a rolling extreme or a cumulative sum, is computed once and
+    reused by every indicator that needs it, so several overlays of one
+    chart cost little more than the most expensive of them.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.nodes = {}
+        self.computed = 0
+        self.reused = 0
+
+    def _node(self, key, compute):
+        """Return the value of node key, computing it on first use."""
+        if key in self.nodes:
+            self.reused += 1
+        else:
+            self.nodes[key] = compute()
+            self.computed += 1
+        return self.nodes[key]
+
+    def column(self, name):
+        """A price column as a float array."""
+        return self._node(('column', name), lambda: as_array(self.columns[name]))
+
+    def _extreme(self, kind, name, window, reduce):
+        """
+        Rolling extreme of a column. A larger window is combined from two
+        overlapping windows of an already computed one at least half its
+        size, e.g. the 52-bar high from the 26-bar high, instead of being
+        scanned again.
+        """
+        def compute():
+            smaller = [key[2] for key in self.nodes
+                       if key[:2] == (kind, name) and window / 2 <= key[2] < window]
+            if not smaller:
+                return _window_result(self.column(name), window,
+                    lambda view: getattr(view, kind)(axis=-1))
+            size = max(smaller)
+            part = self.nodes[(kind, name, size)]
+            result = numpy.full(part.shape, numpy.nan)
+            shift = window - size
+            result[..., shift:] = reduce(part[..., shift:], part[..., :-shift])
+            return result
+        return self._node((kind, name, window), compute)
+
+    def rolling_max(self, name, window):
+        """Highest value of a column over window bars."""
+        return self._extreme('max', name, window, numpy.maximum)
+
+    def rolling_min(self, name, window):
+        """Lowest value of a column over window bars."""
+        return self._extreme('min', name, window, numpy.minimum)
+
+    def rolling_mean(self, name, window):
+        """Simple moving average of a column over window bars."""
+        return self._node(('mean', name, window), lambda: rolling_mean(self.column(name), window))
+
+    def rolling_std(self, name, window):
+        """Sample standard deviation of a column over window bars."""
+        return self._node(('std', name, window), lambda: rolling_std(self.column(name), window))
+
+    def midpoint(self, window):
+        """Middle of the High/Low range over window bars."""
+        return self._node(('midpoint', window),
+            lambda: (self.rolling_max('High', window) + self.rolling_min('Low', window)) / 2)
+
+    def cumulative_volume(self):
+        """Running sums of Close * Volume and of Volume."""
+        def compute():
+            close, volume = self.column('Close'), self.column('Volume')
+            return numpy.cumsum(close * volume, axis=-1), numpy.cumsum(volume, axis=-1)
+        return self._node(('cumulative_volume',), compute)
+
+    def bollinger(self, **kwargs):
+        """(rolling_mean, upper_band, lower_band), see bollinger()."""
+
+        # keywords & vars
+        num_of_std  = kwargs.get('num_of_std', 2)
+        window_size = kwargs.get('window_size', 20)
+
+        mean = self.rolling_mean('Close', window_size)
+        std = self.rolling_std('Close', window_size)
+
+        return mean, mean + std * num_of_std, mean - std * num_of_std
+
+    def ichimoku(self, **kwargs):
+        """Dict of the Ichimoku lines of a single series, see ichimoku()."""
+
+        # Keywords & vars
+        tenkan   = kwargs.get('tenkan', 9)
+        kijun    = kwargs.get('kijun', 26)
+        senkou_b = kwargs.get('senkou_b', 52)
+        chikou   = kwargs.get('chikou', 26)
+
+        close = self.column('Close')
+        length = len(close) + senkou_b
+
+        # Shortest window first, so longer ones can build on it
+        tenkan_sen, kijun_sen, senkou_b_line = (self.midpoint(window)
+            for window in (tenkan, kijun, senkou_b))
+
+        chikou_span = numpy.full(length, numpy.nan)
+        chikou_span[:max(len(close) - chikou, 0)] = close[chikou:]
+
+        return {
+            'Tenkan_sen':  shift_forward(tenkan_sen, 0, length),
+            'Kijun_sen':   shift_forward(kijun_sen, 0, length),
+            'Senkou_a':    shift_forward((tenkan_sen + kijun_sen) / 2, senkou_b, length),
+            'Senkou_b':    shift_forward(senkou_b_line, senkou_b, length),
+            'Chikou_span': chikou_span,
+        }
+
+    def vwap(self):
+        """Cumulative volume-weighted average price."""
+        def compute():
+            price_volume, volume = self.cumulative_volume()
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return price_volume / volume
+        return self._node(('vwap',), compute)
+
+# Function to calculate Bollinger Bands.
+def bollinger(close, **kwargs):
+    """
+    Returns (rolling_mean, upper_band, lower_band) for a set of trendlines
+    num_of_std standard deviations away from a simple moving average.
+    """
+    return IndicatorGraph({'Close': close}).bollinger(**kwargs)
+
+# Function to calculate the Ichimoku Kinko Hyo lines.
+def ichimoku(high, low, close, **kwargs):
+    """
+    Returns a dict of Tenkan_sen, Kijun_sen, Senkou_a, Senkou_b and
+    Chikou_span arrays. Each array is senkou_b bars longer than the input so
+    the cloud can be projected into the future.
+    """
+    return IndicatorGraph({'High': high, 'Low': low, 'Close': close}).ichimoku(**kwargs)
+
+# Function to calculate the Volume-Weighted Average Price.
+def vwap(close, volume):
+    """Cumulative volume-weighted average price."""
+    return IndicatorGraph({'Close': close, 'Volume': volume}).vwap()
@@ -0,0 +1,390 @@
+#!/bin/env -S python3
+"""
+Local columnar store for Yahoo Finance price history.
+
+Each (symbol, interval) is kept as one raw little-endian file per column
+(int64 UTC nanoseconds for the timestamps, float64 for prices and volume)
+plus a small JSON metadata file. Columns are read back as read-only memory
+maps, refreshes only download the bars after the last stored timestamp,
+and any period is served as a slice of what is stored. Coarser intervals
+are resampled from finer stored bars whenever those reach back far enough,
+so they need no download of their own.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from contextlib import ExitStack
+from tempfile import gettempdir
+import numpy
+
+# Local imports
+from resampling import INTERVAL_SECONDS, DAY, can_derive, resample_columns, session_open
+
+# pandas is imported by the functions that build or inspect DataFrames, so
+# importing the store (and the bot) does not pay for it up front
+
+# Stored price columns, in yfinance order
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# Length of the period suffixes accepted by /chart
+PERIOD_UNITS = {'d': 1, 'w': 7, 'wk': 7, 'm': 30, 'mo': 30, 'y': 365}
+
+# Function to turn a period string into a timedelta.
+def period_timedelta(period):
+    """Convert a yfinance style period ('14d', '1w', '3mo', '1y') to a Timedelta."""
+    import pandas
+    match = re.fullmatch(r'(\d+)([a-z]+)', period)
+    if match is None or match.group(2) not in PERIOD_UNITS:
+        raise ValueError(f"Unknown period: {period}")
+    return pandas.Timedelta(days=int(match.group(1)) * PERIOD_UNITS[match.group(2)])
+
+# Function to flatten a yfinance download into plain columns.
+def normalize_download(dataframe):
+    """
+    Return a download with single-level price columns and a tz-aware
+    DatetimeIndex, whatever yfinance version produced it.
+    """
+    import pandas
+    if isinstance(dataframe.columns, pandas.MultiIndex):
+        dataframe = dataframe.droplevel(-1, axis=1)
+    index = pandas.DatetimeIndex(dataframe.index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return dataframe.set_axis(index, axis=0)
+
+# Function to pick one symbol out of a multi-ticker download.
+def split_download(dataframe, symbol):
+    """
+    Return the columns of symbol from a yfinance download of several
+    tickers (grouped either way), or None if it is missing.
+    """
+    import pandas
+    if dataframe is None or not isinstance(dataframe.columns, pandas.MultiIndex):
+        return dataframe
+    for level in range(dataframe.columns.nlevels):
+        if symbol in dataframe.columns.get_level_values(level):
+            return dataframe.xs(symbol, axis=1, level=level)
+    return None
+
+# Function to check a name used as a store directory.
+def check_name(name):
+    """Return name if it is a single path component, else raise ValueError."""
+    if not name or name in ('.', '..') or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError(f"Invalid store name: {name!r}")
+    return name
+
+# Function to download from Yahoo Finance.
+def download(*args, **kwargs):
+    """yfinance.download, imported on the first download."""
+    import yfinance
+    return yfinance.download(*args, **kwargs)
+
+# Class to store price history as memory-mapped columns.
+class MarketStore:
+    """
+    Append-only columnar price store.
+
+    downloader is called like yfinance.download, so a stub can be swapped in
+    to use the store offline.
+    """
+
+    def __init__(self, root=None, downloader=None):
+        if root is None:
+            root = os.path.join(gettempdir(), 'yfstore')
+        if downloader is None:
+            downloader = download
+        self.root = root
+        self.downloader = downloader
+        # Guards the files themselves, held only while writing or opening them
+        self.lock = threading.RLock()
+        # One lock per (symbol, interval), held across a whole refresh
+        self.refresh_locks = {}
+
+    def _path(self, symbol, interval, name):
+        """
+        Path of a column or metadata file. Raises ValueError for a symbol or
+        interval that is not a single path component.
+        """
+        return os.path.join(self.root, check_name(symbol), check_name(interval), name)
+
+    def meta(self, symbol, interval):
+        """Return the metadata dict, empty if nothing is stored yet."""
+        try:
+            with open(self._path(symbol, interval, 'meta.json'), encoding='utf-8') as metafile:
+                return json.load(metafile)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, symbol, interval, meta):
+        """Atomically replace the metadata file."""
+        metapath = self._path(symbol, interval, 'meta.json')
+        with open(f'{metapath}.tmp', 'w', encoding='utf-8') as metafile:
+            json.dump(meta, metafile)
+        os.replace(f'{metapath}.tmp', metapath)
+
+    def columns(self, symbol, interval):
+        """
+        Return a dict of read-only memory-mapped columns, 'Datetime' holding
+        int64 UTC nanoseconds. Empty arrays if nothing is stored.
+        """
+        with self.lock:
+            meta = self.meta(symbol, interval)
+            result = {}
+            for name, dtype in [('Datetime', '<i8')] + [(name, '<f8') for name in COLUMNS]:
+                path = self._path(symbol, interval, f'{name}.col')
+                rows = meta.get('rows', 0)
+                if rows:
+                    result[name] = numpy.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+                else:
+                    result[name] = numpy.empty(0, dtype=dtype)
+        return result
+
+    def refresh_lock(self, symbol, interval):
+        """The lock serializing refreshes of (symbol, interval)."""
+        with self.lock:
+            return self.refresh_locks.setdefault((symbol, interval), threading.Lock())
+
+    def append(self, symbol, interval, dataframe):
+        """
+        Append a download to the stored columns. Stored bars at or after the
+        first downloaded timestamp are replaced, since the last stored bar
+        may still have been forming when it was fetched.
+        """
+        dataframe = normalize_download(dataframe)
+        if dataframe.empty:
+            return 0
+
+        timestamps = dataframe.index.as_unit('ns').asi8
+        with self.lock:
+            os.makedirs(os.path.dirname(self._path(symbol, interval, 'meta.json')), exist_ok=True)
+            meta = self.meta(symbol, interval)
+            stored = self.columns(symbol, interval)['Datetime']
+            keep = int(numpy.searchsorted(stored, timestamps[0], side='left'))
+            del stored
+
+            # Overwrite overlapping rows in place, then extend the files. Files
+            # never shrink, so memory maps handed out earlier stay valid.
+            for name, dtype in [('Datetime', '<i8')] + [(name, '<f8') for name in COLUMNS]:
+                path = self._path(symbol, interval, f'{name}.col')
+                if name == 'Datetime':
+                    values = timestamps
+                elif name in dataframe.columns:
+                    values = dataframe[name].to_numpy()
+                elif name == 'Adj Close':
+                    values = dataframe['Close'].to_numpy()
+                else:
+                    values = numpy.full(len(dataframe), numpy.nan)
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as colfile:
+                    colfile.seek(keep * 8)
+                    colfile.write(numpy.ascontiguousarray(values, dtype=dtype).tobytes())
+
+            meta.update({
+                'rows': keep + len(timestamps),
+                'timezone': str(dataframe.index.tz),
+                'index': dataframe.index.name or ('Datetime' if interval[-1] in 'mh' else 'Date'),
+            })
+            self._write_meta(symbol, interval, meta)
+        return len(timestamps)
+
+    def _plan(self, symbol, interval, period, max_age):
+        """
+        Decide how to refresh (symbol, interval): None if it is fresh,
+        ('start', timestamp) to download after the last stored bar, or
+        ('period', period) for a full download.
+        """
+        meta = self.meta(symbol, interval)
+        now = time.time()
+        covered = bool(meta.get('rows')) \
+            and meta.get('covers', now) <= now - period_timedelta(period).total_seconds()
+        if covered and now - meta.get('fetched', 0) < max_age:
+            return None
+        if covered:
+            import pandas
+            last = self.columns(symbol, interval)['Datetime'][-1]
+            return ('start', pandas.Timestamp(int(last), tz='UTC').to_pydatetime())
+        return ('period', period)
+
+    def _store(self, symbol, interval, period, plan, dataframe):
+        """
+        Write a planned download and stamp the metadata. A full download
+        replaces the stored bars under one hold of the lock, so readers see
+        either the old or the new bars. An empty full download (yfinance
+        returns one when Yahoo errors or throttles) leaves the stored bars
+        and metadata as they were.
+        """
+        now = time.time()
+        if dataframe is not None:
+            dataframe = dataframe.dropna(how='all')
+        if plan[0] == 'period' and (dataframe is None or dataframe.empty):
+            return 0
+
+        with self.lock:
+            if plan[0] == 'period':
+                self.clear(symbol, interval)
+
+            received = 0
+            if dataframe is not None:
+                received = self.append(symbol, interval, dataframe)
+            meta = self.meta(symbol, interval)
+            if meta:
+                if plan[0] == 'period':
+                    meta['covers'] = now - period_timedelta(period).total_seconds()
+                meta['fetched'] = now
+                self._write_meta(symbol, interval, meta)
+        return received
+
+    def refresh(self, symbol, interval, period, **kwargs):
+        """
+        Bring the stored bars up to date. Only bars after the last stored
+        timestamp are downloaded, unless the stored history does not reach
+        back far enough for period. Returns the number of bars received.
+        Concurrent refreshes of (symbol, interval) run one after the other,
+        so a later one plans from what the earlier one stored.
+        """
+
+        # keywords & vars
+        max_age = kwargs.get('max_age', 300)
+
+        with self.refresh_lock(symbol, interval):
+            plan = self._plan(symbol, interval, period, max_age)
+            if plan is None:
+                return 0
+
+            dataframe = self.downloader(symbol, interval=interval, progress=False,
+                **{plan[0]: plan[1]})
+            return self._store(symbol, interval, period, plan, dataframe)
+
+    def refresh_many(self, symbols, interval, period, **kwargs):
+        """
+        Bring several symbols up to date with at most two batched downloads:
+        one for full periods and one for the bars after the oldest last
+        stored timestamp. Returns {symbol: bars received}. Holds the refresh
+        lock of every symbol, taken in sorted order.
+        """
+
+        # keywords & vars
+        max_age = kwargs.get('max_age', 300)
+
+        received = {symbol: 0 for symbol in symbols}
+        with ExitStack() as stack:
+            for symbol in sorted(set(symbols)):
+                stack.enter_context(self.refresh_lock(symbol, interval))
+            plans = {symbol: self._plan(symbol, interval, period, max_age) for symbol in symbols}
+
+            for kind in ('period', 'start'):
+                batch = [symbol for symbol, plan in plans.items() if plan and plan[0] == kind]
+                if not batch:
+                    continue
+                value = period if kind == 'period' else min(plans[symbol][1] for symbol in batch)
+                dataframe = self.downloader(batch, interval=interval, progress=False,
+                    group_by='ticker', **{kind: value})
+                for symbol in batch:
+                    received[symbol] = self._store(symbol, interval, period, plans[symbol],
+                        split_download(dataframe, symbol))
+        return received
+
+    def intervals(self, symbol):
+        """Intervals with bars stored for symbol."""
+        try:
+            names = os.listdir(os.path.join(self.root, check_name(symbol)))
+        except FileNotFoundError:
+            return []
+        return [name for name in names if self.meta(symbol, name).get('rows')]
+
+    def source(self, symbol, interval, period):
+        """
+        Interval to refresh and read (symbol, interval, period) from: interval
+        itself if its stored bars cover period or no finer stored interval
+        does, otherwise the coarsest finer one that covers it.
+        """
+        since = time.time() - period_timedelta(period).total_seconds()
+        covering = [name for name in [interval] + self.intervals(symbol)
+                    if (name == interval or can_derive(name, interval))
+                    and self.meta(symbol, name).get('covers', since + 1) <= since]
+        if not covering or interval in covering:
+            return interval
+        return max(covering, key=INTERVAL_SECONDS.get)
+
+    def session(self, symbol, interval):
+        """
+        Trading session of symbol learned from its stored intraday bars: a
+        dict of 'timezone', 'open' and 'close' (seconds after local
+        midnight) and 'days' (weekdays, Monday = 0), or None if no intraday
+        bars are stored.
+        """
+        import pandas
+        intraday = [name for name in [interval] + self.intervals(symbol)
+                    if INTERVAL_SECONDS.get(name, 86_400) < 86_400 and self.meta(symbol, name).get('rows')]
+        if not intraday:
+            return None
+        name = min(intraday, key=INTERVAL_SECONDS.get)
+        timezone = self.meta(symbol, name).get('timezone', 'UTC')
+        timestamps = numpy.array(self.columns(symbol, name)['Datetime'])
+        local = pandas.DatetimeIndex(timestamps, tz='UTC').tz_convert(timezone).tz_localize(None).asi8
+
+        # The most common end of the last bar of each day closes the session
+        days = local // DAY
+        lasts = numpy.flatnonzero(numpy.diff(days, append=days[-1] + 1))
+        closes, counts = numpy.unique(local[lasts] % DAY, return_counts=True)
+        return {
+            'timezone': timezone,
+            'open': int(session_open(local) // 10**9),
+            'close': min(int(closes[counts.argmax()] // 10**9) + INTERVAL_SECONDS[name], 86_400),
+            # 1970-01-01 was a Thursday
+            'days': sorted({int(day) for day in (numpy.unique(days) + 3) % 7}),
+        }
+
+    def clear(self, symbol, interval):
+        """Forget everything stored for (symbol, interval)."""
+        with self.lock:
+            for name in ['meta.json', 'Datetime.col'] + [f'{name}.col' for name in COLUMNS]:
+                try:
+                    os.remove(self._path(symbol, interval, name))
+                except FileNotFoundError:
+                    pass
+
+    def frame(self, symbol, interval, period=None, source=None):
+        """
+        Return the stored bars as a DataFrame laid out like a yfinance CSV
+        read back with pandas.read_csv, limited to the last period, but with
+        a tz-aware datetime64 Datetime (or Date) column instead of strings.
+        With a finer source interval, its bars are resampled to interval.
+        """
+        import pandas
+        source = source or interval
+        with self.lock:
+            meta = self.meta(symbol, source)
+            columns = self.columns(symbol, source)
+        timezone = meta.get('timezone', 'UTC')
+        timestamps = columns['Datetime']
+
+        cutoff = None
+        if period is not None and len(timestamps):
+            cutoff = timestamps[-1] - period_timedelta(period).value
+
+        if source != interval:
+            # Resample from one coarse bar before the cutoff, so the first
+            # bar kept is complete
+            if cutoff is not None:
+                first = int(numpy.searchsorted(timestamps,
+                    cutoff - INTERVAL_SECONDS[interval] * 10**9, side='right'))
+                columns = {name: values[first:] for name, values in columns.items()}
+            columns = resample_columns(columns, timezone, interval)
+            timestamps = columns['Datetime']
+            index_name = 'Datetime' if interval[-1] in 'mh' else 'Date'
+        else:
+            index_name = meta.get('index', 'Datetime')
+
+        first = 0
+        if cutoff is not None:
+            first = int(numpy.searchsorted(timestamps, cutoff, side='right'))
+
+        # Timestamps stay datetime64, converted to the exchange timezone once
+        index = pandas.DatetimeIndex(timestamps[first:], tz='UTC').tz_convert(timezone)
+
+        dataframe = pandas.DataFrame({name: columns[name][first:] for name in COLUMNS})
+        dataframe.insert(0, index_name, index)
+        return dataframe
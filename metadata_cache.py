@@ -0,0 +1,109 @@
+#!/bin/env -S python3
+"""
+Persistent on-disk cache of ticker metadata (short name and friends).
+
+Looking a name up never waits on Yahoo Finance: a miss or stale entry
+returns what is known (or the bare symbol) and refreshes in the background.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from tempfile import gettempdir
+from concurrent.futures import ThreadPoolExecutor
+
+# Metadata fields kept from yfinance.Ticker().info
+FIELDS = ['shortName', 'longName', 'exchange', 'currency', 'quoteType']
+
+# Function to fetch ticker metadata from Yahoo Finance.
+def fetch_info(symbol):
+    """Return the cached FIELDS of yfinance.Ticker(symbol).info."""
+    import yfinance
+    info = yfinance.Ticker(symbol).info
+    return {field: info[field] for field in FIELDS if field in info}
+
+# Class to cache ticker metadata on disk.
+class TickerMetadataCache:
+    """
+    JSON file of {symbol: {fetched, FIELDS...}} entries that expire after
+    ttl seconds. fetcher is called with a symbol and returns a dict, so a
+    stub can be used offline.
+    """
+
+    def __init__(self, path=None, **kwargs):
+        if path is None:
+            path = os.path.join(gettempdir(), 'ticker_metadata.json')
+        self.path = path
+        self.ttl = kwargs.get('ttl', 7 * 24 * 3600)
+        self.retry = kwargs.get('retry', 300)
+        self.fetcher = kwargs.get('fetcher', fetch_info)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.failed = {}
+        self.entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as cachefile:
+                self.entries = json.load(cachefile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def _save(self):
+        """Atomically write the entries to disk. Caller holds the lock."""
+        with open(f'{self.path}.tmp', 'w', encoding='utf-8') as cachefile:
+            json.dump(self.entries, cachefile)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def fresh(self, symbol):
+        """True if symbol has an entry younger than ttl."""
+        entry = self.entries.get(symbol)
+        return entry is not None and time.time() - entry['fetched'] < self.ttl
+
+    def get(self, symbol):
+        """Return the stored metadata for symbol (possibly stale), or None."""
+        return self.entries.get(symbol)
+
+    def fetch(self, symbol):
+        """Fetch and store metadata for symbol now, returning it or None."""
+        try:
+            metadata = self.fetcher(symbol)
+        except Exception as error:
+            logging.warning("Metadata fetch failed for %s: %s", symbol, error)
+            metadata = None
+        with self.lock:
+            self.pending.discard(symbol)
+            if metadata is None:
+                self.failed[symbol] = time.time()
+            else:
+                self.entries[symbol] = {**metadata, 'fetched': time.time()}
+                self._save()
+        return metadata
+
+    def refresh_later(self, symbol):
+        """
+        Fetch metadata for symbol on a background thread, once at a time and
+        not again within retry seconds of a failure.
+        """
+        with self.lock:
+            if symbol in self.pending or time.time() - self.failed.get(symbol, 0) < self.retry:
+                return
+            self.pending.add(symbol)
+        threading.Thread(target=self.fetch, args=(symbol,), daemon=True).start()
+
+    def prefill(self, symbols, workers=8):
+        """Fetch every missing or stale symbol of a watchlist, in parallel."""
+        stale = [symbol for symbol in symbols if not self.fresh(symbol)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self.fetch, stale))
+        return len(stale)
+
+    def short_name(self, symbol):
+        """
+        Return the short name of symbol without blocking. Falls back to the
+        bare symbol on a miss, refreshing in the background.
+        """
+        if not self.fresh(symbol):
+            self.refresh_later(symbol)
+        entry = self.get(symbol) or {}
+        return entry.get('shortName') or entry.get('longName') or symbol
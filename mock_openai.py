@@ -0,0 +1,162 @@
+#!/bin/env -S python3
+"""
+Local stand-in for the OpenAI completions API.
+
+Point the openai package at it with openai.api_base = MockOpenAI().api_base.
+Answers are deterministic, can be delayed to mimic model latency and are
+streamed word by word as server-sent events when the request asks for it.
+$ mock_openai.py [port]
+"""
+
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Class to answer OpenAI API requests.
+class _Handler(BaseHTTPRequestHandler):
+    """Routes /v1/<endpoint> requests to the MockOpenAI."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        """Keep the console quiet."""
+
+    def setup(self):
+        """Count each new client connection."""
+        super().setup()
+        self.server.api.count('connections')
+
+    def _reply(self, status, result):
+        """Send a JSON response."""
+        payload = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        """List the available engines/models."""
+        self.server.api.count('models')
+        self._reply(200, {'object': 'list', 'data': [
+            {'id': model, 'object': 'engine', 'ready': True} for model in self.server.api.models]})
+
+    def do_POST(self):
+        """Answer a completion request."""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        params = json.loads(body or b'{}')
+        if self.server.api.fail():
+            self._reply(503, {'error': {'message': 'The server is overloaded', 'type': 'server_error'}})
+            return
+        if params.get('stream'):
+            self._stream(self.server.api.complete_stream(params))
+            return
+        self._reply(200, self.server.api.complete(params))
+
+    def _stream(self, events):
+        """Send server-sent events with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for event in events:
+                payload = f'data: {event}\n\n'.encode()
+                self.wfile.write(f'{len(payload):x}\r\n'.encode() + payload + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. after the first token
+            self.close_connection = True
+
+# Class to fake the OpenAI completions API.
+class MockOpenAI:
+    """
+    In-process completions server. latency delays every answer (or the
+    first token of a streamed one), token_latency each further streamed
+    word, and the first failures completion requests get 503 errors.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, **kwargs):
+        self.latency = kwargs.get('latency', 0.0)
+        self.token_latency = kwargs.get('token_latency', 0.0)
+        self.failures = kwargs.get('failures', 0)
+        self.models = kwargs.get('models', ['text-ada-001', 'text-babbage-001',
+            'text-curie-001', 'text-davinci-002', 'text-davinci-003', 'code-davinci-002'])
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.thread = None
+
+    @property
+    def api_base(self):
+        """api_base for the openai package."""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, endpoint):
+        """Count a request to endpoint."""
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def fail(self):
+        """True while injected failures remain."""
+        with self.lock:
+            if self.failures <= 0:
+                return False
+            self.failures -= 1
+            self.calls['failures'] = self.calls.get('failures', 0) + 1
+            return True
+
+    @staticmethod
+    def answer(prompt):
+        """Deterministic answer text for prompt."""
+        if isinstance(prompt, list):
+            prompt = ''.join(prompt)
+        words = str(prompt).split() or ['empty']
+        return '\n' + ' '.join(f'{word[::-1]}' for word in words)
+
+    def complete(self, params):
+        """Build a text_completion response for params."""
+        self.count('completions')
+        text = self.answer(params.get('prompt', ''))
+        time.sleep(self.latency + self.token_latency * (len(text.split(' ')) - 1))
+        return {'id': 'cmpl-mock', 'object': 'text_completion', 'created': int(time.time()),
+                'model': params.get('model', 'mock'),
+                'choices': [{'text': text, 'index': 0, 'logprobs': None, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(text.split()),
+                          'total_tokens': len(text.split())}}
+
+    def complete_stream(self, params):
+        """Yield the text_completion events of a streamed answer, then [DONE]."""
+        self.count('streams')
+        time.sleep(self.latency)
+        words = self.answer(params.get('prompt', '')).split(' ')
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(self.token_latency)
+            yield json.dumps({'id': 'cmpl-mock', 'object': 'text_completion',
+                'created': int(time.time()), 'model': params.get('model', 'mock'),
+                'choices': [{'text': word if not index else f' {word}', 'index': 0,
+                             'logprobs': None, 'finish_reason': None}]})
+        yield '[DONE]'
+
+if __name__ == '__main__':
+    mock = MockOpenAI(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print(f"Serving mock OpenAI API on {mock.api_base}")
+    mock.server.serve_forever()
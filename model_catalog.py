@@ -0,0 +1,77 @@
+#!/bin/env -S python3
+"""
+Persistent on-disk catalog of the available OpenAI model ids.
+
+Listing models never waits on the API once the catalog has been fetched:
+a stale catalog is returned as is and refreshed in the background.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from tempfile import gettempdir
+
+# Class to cache the model catalog on disk.
+class ModelCatalog:
+    """
+    JSON file of {fetched, models} that goes stale after ttl seconds.
+    fetcher is called with no arguments and returns a list of model ids,
+    so a stub can be used offline.
+    """
+
+    def __init__(self, fetcher, path=None, **kwargs):
+        if path is None:
+            path = os.path.join(gettempdir(), 'openai_models.json')
+        self.path = path
+        self.ttl = kwargs.get('ttl', 24 * 3600)
+        self.fetcher = fetcher
+        self.lock = threading.Lock()
+        self.thread = None
+        self.catalog = None
+        try:
+            with open(self.path, encoding='utf-8') as catalogfile:
+                self.catalog = json.load(catalogfile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def fresh(self):
+        """True if the catalog is younger than ttl."""
+        return self.catalog is not None and time.time() - self.catalog['fetched'] < self.ttl
+
+    def fetch(self):
+        """Fetch and store the catalog now, returning the model ids."""
+        models = sorted(self.fetcher())
+        with self.lock:
+            self.catalog = {'fetched': time.time(), 'models': models}
+            with open(f'{self.path}.tmp', 'w', encoding='utf-8') as catalogfile:
+                json.dump(self.catalog, catalogfile)
+            os.replace(f'{self.path}.tmp', self.path)
+        return models
+
+    def _refresh(self):
+        """Background fetch, logging instead of raising."""
+        try:
+            self.fetch()
+        except Exception as error:
+            logging.warning("Model catalog refresh failed: %s", error)
+
+    def refresh_later(self):
+        """Fetch the catalog on a daemon thread unless one is running."""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._refresh, name='models', daemon=True)
+            self.thread.start()
+
+    def models(self, refresh=False):
+        """
+        Return the model ids. Only a missing catalog (or refresh=True) is
+        fetched synchronously; a stale one is refreshed in the background.
+        """
+        if refresh or self.catalog is None:
+            return self.fetch()
+        if not self.fresh():
+            self.refresh_later()
+        return list(self.catalog['models'])
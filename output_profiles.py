@@ -0,0 +1,15 @@
+#!/bin/env -S python3
+"""
+Named image outputs of the charts, kept apart from candlestick_chart so
+that a profile name can be checked without loading matplotlib.
+"""
+
+# Named image outputs: target width in pixels (or a fixed dpi), image
+# format and Pillow encoder options
+OUTPUT_PROFILES = {
+    # Telegram shows photos at most 2560 pixels wide and re-encodes them as JPEG
+    'telegram-preview': {'width': 2560, 'format': 'jpeg', 'options': {'quality': 90}},
+    # Flat chart colours compress better losslessly than with lossy WebP
+    'web': {'width': 1600, 'format': 'webp', 'options': {'lossless': True, 'method': 4}},
+    'archive': {'dpi': 600, 'format': 'png', 'options': {'compress_level': 6}},
+}
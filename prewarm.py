@@ -0,0 +1,210 @@
+#!/bin/env -S python3
+"""
+Background pre-warming of popular charts.
+
+A scheduler thread refreshes the data of every watched (symbol, interval,
+period, chart) target just after each of its bars closes and pre-renders
+the chart, so /chart finds it in the render cache. Bars close on the
+symbol's exchange session, so nothing is warmed while the market is
+closed. Targets come from a configured watchlist plus the most requested
+charts of the last hour, and all warm-up work shares a time budget.
+"""
+
+import time
+import heapq
+import logging
+import threading
+import datetime
+from zoneinfo import ZoneInfo
+from collections import Counter, deque
+
+# Local imports
+from chart_options import SYMBOL_PATTERN, INTERVALS, PERIODS, parse_overlays
+
+# Seconds per bar of the /chart intervals
+INTERVAL_SECONDS = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '1d': 86400}
+
+# Function to parse a watchlist string.
+def parse_watchlist(text, **kwargs):
+    """
+    Parse 'AAPL,MSFT:5m,NVDA:1h:1y:ichimoku' into (symbol, interval, period,
+    chart) targets, filling omitted fields from the keyword defaults. Entries
+    are normalized the way /chart normalizes a request, so they warm the
+    render cache keys /chart looks up; entries /chart would not accept are
+    logged and dropped.
+    """
+
+    # keywords & vars
+    interval = kwargs.get('interval', '15m')
+    period   = kwargs.get('period', '14d')
+    chart    = kwargs.get('chart', 'vwap')
+
+    targets = []
+    for entry in filter(None, (item.strip() for item in text.split(','))):
+        fields = entry.split(':')
+        fields += [None] * (4 - len(fields))
+        symbol = fields[0].upper()
+        overlays = parse_overlays(fields[3] or chart)
+        if len(fields) > 4 or not SYMBOL_PATTERN.fullmatch(symbol) or overlays is None \
+                or (fields[1] or interval) not in INTERVALS or (fields[2] or period) not in PERIODS:
+            logging.warning("Skipping watchlist entry %r", entry)
+            continue
+        targets.append((symbol, fields[1] or interval, fields[2] or period, '+'.join(overlays)))
+    return targets
+
+# Session assumed for symbols without stored intraday bars: US equities
+DEFAULT_SESSION = {'timezone': 'America/New_York', 'open': 9 * 3600 + 1800,
+                   'close': 16 * 3600, 'days': [0, 1, 2, 3, 4]}
+
+# Function to find when the current bar closes.
+def next_bar_close(interval, now=None, session=None):
+    """
+    Epoch seconds of the next close of an interval bar within session (a
+    dict of timezone, open and close seconds after local midnight and
+    trading weekdays, DEFAULT_SESSION if None). Intraday bars are counted
+    from the session open and the last one ends at the close; daily bars
+    close with the session.
+    """
+    if now is None:
+        now = time.time()
+    session = session or DEFAULT_SESSION
+    timezone = ZoneInfo(session['timezone'])
+    seconds = INTERVAL_SECONDS.get(interval, 900)
+
+    # Bar closes of the session in seconds after local midnight
+    if seconds >= 86400:
+        closes = [session['close']]
+    else:
+        closes = list(range(session['open'] + seconds, session['close'], seconds)) + [session['close']]
+
+    today = datetime.datetime.fromtimestamp(now, timezone).date()
+    for offset in range(8):
+        day = today + datetime.timedelta(days=offset)
+        if day.weekday() not in session['days']:
+            continue
+        midnight = datetime.datetime.combine(day, datetime.time(), timezone)
+        for close in closes:
+            # Wall-clock time, so daylight saving changes keep the session hours
+            moment = (midnight + datetime.timedelta(seconds=close)).timestamp()
+            if moment > now:
+                return moment
+    return now + seconds
+
+# Class to pre-warm charts in the background.
+class PrewarmScheduler:
+    """
+    Calls warm(symbol, interval, period, chart) for every target shortly
+    after its bar closes.
+
+    watchlist is a list of targets, top_n how many of the most requested
+    charts of the last hour are warmed as well, grace the seconds to wait
+    after a bar closes, and time_budget the share of wall-clock time that
+    warm calls may spend, downloads and renders included (0.25 = a
+    quarter of the time). session(symbol, interval) returns the trading
+    session of a symbol, or None for DEFAULT_SESSION.
+    """
+
+    def __init__(self, warm, **kwargs):
+        self.warm        = warm
+        self.watchlist   = list(kwargs.get('watchlist', []))
+        self.top_n       = kwargs.get('top_n', 10)
+        self.grace       = kwargs.get('grace', 5)
+        self.time_budget = kwargs.get('time_budget', 0.25)
+        self.window      = kwargs.get('window', 3600)
+        self.session     = kwargs.get('session', lambda symbol, interval: None)
+        self.requests = deque()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started = time.monotonic()
+        self.busy = 0.0
+        self.counters = Counter()
+
+    def record(self, symbol, interval, period, chart):
+        """Note a user request so frequently charted targets get warmed."""
+        with self.lock:
+            self.requests.append((time.time(), (symbol, interval, period, chart)))
+
+    def targets(self):
+        """Watchlist targets plus the top_n requested in the last window."""
+        cutoff = time.time() - self.window
+        with self.lock:
+            while self.requests and self.requests[0][0] < cutoff:
+                self.requests.popleft()
+            popular = Counter(target for _, target in self.requests)
+        targets = list(dict.fromkeys(self.watchlist))
+        for target, _ in popular.most_common():
+            if len(targets) >= len(self.watchlist) + self.top_n:
+                break
+            if target not in targets:
+                targets.append(target)
+        return targets
+
+    def within_budget(self):
+        """True while warm calls have used less than time_budget of the run time."""
+        return self.busy <= self.time_budget * (time.monotonic() - self.started)
+
+    def session_of(self, target):
+        """Trading session of a target, None if it cannot be looked up."""
+        try:
+            return self.session(target[0], target[1])
+        except Exception:
+            logging.exception("Session lookup for %s failed", target)
+            return None
+
+    def run_once(self, target):
+        """Warm one target if the budget allows, returning whether it ran."""
+        if not self.within_budget():
+            self.counters['skipped'] += 1
+            return False
+        start = time.monotonic()
+        try:
+            self.warm(*target)
+            self.counters['warmed'] += 1
+        except Exception:
+            self.counters['failed'] += 1
+            logging.exception("Pre-warming %s failed", target)
+        finally:
+            self.busy += time.monotonic() - start
+        return True
+
+    def _loop(self):
+        """Wake up after each bar close and warm the targets that are due."""
+        due = []
+        scheduled = set()
+        while not self.stop_event.is_set():
+            now = time.time()
+            for target in self.targets():
+                if target not in scheduled:
+                    close = next_bar_close(target[1], now, self.session_of(target))
+                    heapq.heappush(due, (close + self.grace, target))
+                    scheduled.add(target)
+
+            if due and due[0][0] <= now:
+                _, target = heapq.heappop(due)
+                scheduled.discard(target)
+                if target in self.targets():
+                    self.run_once(target)
+                continue
+
+            # Sleep until the next target is due, rechecking new requests each minute
+            wait = min(due[0][0] - now, 60) if due else 60
+            self.stop_event.wait(max(wait, 0))
+
+    def start(self):
+        """Run the scheduler on a daemon thread."""
+        self.thread = threading.Thread(target=self._loop, name='prewarm', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the scheduler thread."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def stats(self):
+        """Return warmed/skipped/failed counts and the share of time used."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {**self.counters, 'targets': len(self.targets()),
+                'time_share': self.busy / elapsed}
@@ -0,0 +1,105 @@
+#!/bin/env -S python3
+"""
+In-memory LRU cache for encoded chart images.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy
+
+# Function to fingerprint the data behind a chart.
+def fingerprint(dataframe):
+    """
+    Short digest of a price DataFrame. Any new, revised or dropped bar
+    changes it, so it can key a rendered chart.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(len(dataframe)).encode())
+    if len(dataframe):
+        digest.update(str(dataframe.iloc[0, 0]).encode())
+        digest.update(str(dataframe.iloc[-1, 0]).encode())
+    for name in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        if name in dataframe:
+            digest.update(numpy.ascontiguousarray(dataframe[name], dtype=numpy.float64).tobytes())
+    return digest.hexdigest()
+
+# Class to cache rendered images within a byte budget.
+class RenderCache:
+    """
+    Least-recently-used cache of image bytes. Entries are evicted oldest
+    first once their total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.warmed = {}
+        self.warm_puts = 0
+        self.warm_used = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached bytes for key, or None."""
+        with self.lock:
+            image = self.entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if key in self.warmed:
+                self.warm_used += not self.warmed[key]
+                self.warmed[key] += 1
+            return image
+
+    def __contains__(self, key):
+        """True if key is cached, without counting a hit or miss."""
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, image, warmed=False):
+        """
+        Cache image under key, evicting least recently used entries. Hits on
+        entries put with warmed=True are tracked for warm_report().
+        """
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            if len(image) > self.max_bytes:
+                return
+            self.entries[key] = image
+            self.size += len(image)
+            if warmed:
+                self.warmed[key] = 0
+                self.warm_puts += 1
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+                self.warmed.pop(evicted_key, None)
+
+    def get_or_render(self, key, render, *args, **kwargs):
+        """Return the cached bytes for key, calling render to fill a miss."""
+        image = self.get(key)
+        if image is None:
+            image = render(*args, **kwargs)
+            self.put(key, image)
+        return image
+
+    def warm_report(self):
+        """Return {key: hits} for every pre-rendered entry still cached."""
+        with self.lock:
+            return dict(self.warmed)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.entries), 'bytes': self.size,
+                    'warmed': self.warm_puts, 'warm_used': self.warm_used,
+                    'max_bytes': self.max_bytes}
@@ -0,0 +1,117 @@
+#!/bin/env -S python3
+"""
+Derive coarser bars from finer ones, the way Yahoo Finance builds them.
+
+Intraday bars are grouped from the session open of each day in the
+exchange timezone (so 1h bars of a 09:30 open start at 09:30, 10:30, ...),
+daily bars by local date, weekly bars from Monday and monthly bars by
+calendar month. Each bar takes the first open, highest high, lowest low
+and last close of its group and sums the volume.
+
+Daily bars built from intraday ones only cover the regular session, so
+their volume can differ a little from Yahoo's consolidated daily volume.
+"""
+
+import numpy
+
+# Local imports
+from downsampling import ohlc_runs
+
+# Nanoseconds per day
+DAY = 86_400 * 10**9
+
+# Longest span of each yfinance interval in seconds
+INTERVAL_SECONDS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400,
+    '1h': 3600, '1d': 86_400, '5d': 5 * 86_400, '1wk': 7 * 86_400, '1mo': 31 * 86_400,
+    '3mo': 92 * 86_400,
+}
+
+# Intervals bucketed by the exchange calendar rather than a fixed span
+CALENDAR = ('1d', '1wk', '1mo', '3mo')
+
+# Function to tell whether one interval can be built from another.
+def can_derive(source, target):
+    """True if bars of target can be resampled from bars of source."""
+    if source not in INTERVAL_SECONDS or target not in INTERVAL_SECONDS or '5d' in (source, target):
+        return False
+    if INTERVAL_SECONDS[source] >= INTERVAL_SECONDS[target]:
+        return False
+    if target in ('1d', '1wk'):
+        return True
+    if target in ('1mo', '3mo'):
+        # Weeks straddle month ends
+        return source != '1wk'
+    return source not in CALENDAR and INTERVAL_SECONDS[target] % INTERVAL_SECONDS[source] == 0
+
+# Function to find the usual session open.
+def session_open(local):
+    """Most common time of day, in nanoseconds, of the first bar of each local day."""
+    days = local // DAY
+    firsts = numpy.flatnonzero(numpy.diff(days, prepend=days[0] - 1))
+    opens, counts = numpy.unique(local[firsts] % DAY, return_counts=True)
+    return opens[counts.argmax()]
+
+# Function to label every bar with its coarser bar.
+def bucket_labels(timestamps, timezone, interval):
+    """
+    Start of the interval bar each bar belongs to, as int64 UTC
+    nanoseconds, for sorted int64 UTC nanosecond timestamps.
+    """
+    import pandas
+    timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+    if not len(timestamps):
+        return timestamps
+
+    # Wall-clock nanoseconds in the exchange timezone
+    index = pandas.DatetimeIndex(timestamps, tz='UTC').tz_convert(timezone)
+    local = index.tz_localize(None).asi8
+    offset = timestamps - local
+
+    if interval not in CALENDAR:
+        # Fixed spans counted from the session open; the bucket start keeps
+        # the UTC offset of its bars
+        span = INTERVAL_SECONDS[interval] * 10**9
+        anchor = session_open(local)
+        starts = local // DAY * DAY + anchor + (local % DAY - anchor) // span * span
+        return starts + offset
+
+    days = local // DAY
+    if interval == '1d':
+        starts = days * DAY
+    elif interval == '1wk':
+        # 1970-01-01 was a Thursday
+        starts = (days - (days + 3) % 7) * DAY
+    else:
+        months = local.astype('datetime64[ns]').astype('datetime64[M]').astype(numpy.int64)
+        if interval == '3mo':
+            months = months // 3 * 3
+        starts = months.astype('datetime64[M]').astype('datetime64[ns]').astype(numpy.int64)
+
+    # Local midnights back to UTC, across daylight saving changes
+    return pandas.DatetimeIndex(starts).tz_localize(timezone, ambiguous=True,
+        nonexistent='shift_forward').tz_convert('UTC').asi8
+
+# Function to resample stored columns.
+def resample_columns(columns, timezone, interval):
+    """
+    Resample a dict of columns as returned by MarketStore.columns() to
+    interval, returning a dict of the same columns.
+    """
+    labels = bucket_labels(columns['Datetime'], timezone, interval)
+    if not len(labels):
+        return {name: numpy.asarray(values) for name, values in columns.items()}
+    starts = numpy.flatnonzero(numpy.diff(labels, prepend=labels[0] - 1))
+
+    bars = ohlc_runs(columns['Open'], columns['High'], columns['Low'], columns['Close'],
+        starts, columns['Volume'])
+    adjusted = numpy.asarray(columns['Adj Close'])[bars['last']]
+    return {
+        'Datetime': labels[starts],
+        'Open': bars['Open'],
+        'High': bars['High'],
+        'Low': bars['Low'],
+        'Close': bars['Close'],
+        'Adj Close': numpy.where(numpy.isnan(bars['Close']), numpy.nan, adjusted),
+        'Volume': bars['Volume'],
+    }
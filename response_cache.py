@@ -0,0 +1,105 @@
+#!/bin/env -S python3
+"""
+Persistent on-disk cache of OpenAI completions.
+
+Answers are stored zlib-compressed in a SQLite file keyed by a digest of
+the request parameters, expire after a TTL and are evicted least recently
+used first once the file holds more than max_bytes of answers. SQLite's
+WAL journal lets the bot and the CLI share one cache file.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from tempfile import gettempdir
+
+# Function to key a completion request.
+def request_key(**params):
+    """Digest of the completion parameters (model, prompt, temperature, ...)."""
+    payload = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+# Class to cache completions on disk.
+class ResponseCache:
+    """
+    SQLite table of {key: answer} entries that expire after ttl seconds,
+    bounded to max_bytes of compressed answers.
+    """
+
+    def __init__(self, path=None, **kwargs):
+        if path is None:
+            path = os.path.join(gettempdir(), 'openai_responses.sqlite')
+        self.path = path
+        self.ttl = kwargs.get('ttl', 7 * 24 * 3600)
+        self.max_bytes = kwargs.get('max_bytes', 32 * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False,
+            isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, created REAL, used REAL, size INTEGER, answer BLOB)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+
+    def get(self, key):
+        """Return the cached answer for key, or None if missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT answer, used FROM responses WHERE key = ? AND created > ?',
+                (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Recency only needs minute resolution, which keeps hot hits read-only
+            if now - row[1] > 60:
+                self.db.execute('UPDATE responses SET used = ? WHERE key = ?', (now, key))
+        return zlib.decompress(row[0]).decode()
+
+    def put(self, key, answer):
+        """Store answer under key, then evict down to max_bytes."""
+        now = time.time()
+        blob = zlib.compress(answer.encode())
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, now, now, len(blob), blob))
+            self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries and the least recently used over budget. Caller holds the lock."""
+        self.db.execute('DELETE FROM responses WHERE created <= ?', (now - self.ttl,))
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self.db.execute('SELECT key, size FROM responses ORDER BY used'):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.db.executemany('DELETE FROM responses WHERE key = ?', stale)
+
+    def stats(self):
+        """Return hit/miss counts, entries and stored bytes."""
+        with self.lock:
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries,
+                'bytes': size, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        """Forget every cached answer."""
+        with self.lock:
+            self.db.execute('DELETE FROM responses')
+
+    def close(self):
+        """Close the database connection."""
+        with self.lock:
+            self.db.close()
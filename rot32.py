@@ -1,31 +1,130 @@
 #!/bin/env -S python3
-""" Convert a string to rot13. """
+"""
+Convert a string, stdin or files to rot13.
 
+Data is transformed with one translation table, either on str or directly
+on bytes: ASCII letters are single bytes in UTF-8 and never occur inside a
+multi-byte sequence, so streams are translated without decoding. Large
+regular files can be split across worker processes that memory-map them.
+$ rot32.py "Hello world"
+$ rot32.py < big.log > big.rot
+$ rot32.py -j 4 -f big.log -f other.log > both.rot
+"""
+
+import os
 import sys
+import mmap
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Bytes read and written per step
+CHUNK_SIZE = 1 << 20
+
+# Bytes per worker task when a file is split across processes
+SPLIT_SIZE = 16 << 20
+
+# Letters map to the lowercase letter 13 places on, as rot32() always did
+UPPER = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+LOWER = b'abcdefghijklmnopqrstuvwxyz'
+ROTATED = LOWER[13:] + LOWER[:13]
+BYTES_TABLE = bytes.maketrans(UPPER + LOWER, ROTATED + ROTATED)
+TEXT_TABLE = str.maketrans((UPPER + LOWER).decode(), (ROTATED + ROTATED).decode())
+
+# Function to transform data in memory.
+def transform(data):
+    """ Return rot32 of str or bytes-like data, as the same kind. """
+    if isinstance(data, str):
+        return data.translate(TEXT_TABLE)
+    return bytes(data).translate(BYTES_TABLE)
+
+# Function to transform a binary stream.
+def transform_stream(infile, outfile, chunk_size=CHUNK_SIZE):
+    """ Copy binary infile to outfile in chunks, returning the bytes written. """
+    total = 0
+    while True:
+        chunk = infile.read(chunk_size)
+        if not chunk:
+            return total
+        outfile.write(chunk.translate(BYTES_TABLE))
+        total += len(chunk)
+
+# Function to transform part of a file in a worker process.
+def _transform_range(path, start, end):
+    """ Return rot32 of bytes start:end of path. """
+    with open(path, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[start:end].translate(BYTES_TABLE)
+
+# Function to transform a file.
+def transform_file(path, outfile, **kwargs):
+    """
+    Write rot32 of the file at path to binary outfile, returning the bytes
+    written. With workers > 1, regular files larger than split_size are
+    split into ranges that worker processes memory-map and translate, and
+    the ranges are written back in order.
+    """
+
+    # keywords & vars
+    chunk_size = kwargs.get('chunk_size', CHUNK_SIZE)
+    split_size = kwargs.get('split_size', SPLIT_SIZE)
+    workers    = kwargs.get('workers', 1)
+
+    size = os.path.getsize(path) if os.path.isfile(path) else 0
+    if workers > 1 and size > split_size:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep at most two ranges per worker in flight to bound memory
+            pending = deque()
+            for start in range(0, size, split_size):
+                pending.append(pool.submit(_transform_range, path, start,
+                    min(start + split_size, size)))
+                if len(pending) >= 2 * workers:
+                    outfile.write(pending.popleft().result())
+            while pending:
+                outfile.write(pending.popleft().result())
+        return size
+
+    # A single process copies less with read() than with slices of a mapping
+    with open(path, 'rb') as infile:
+        return transform_stream(infile, outfile, chunk_size)
 
 # Convert a string to rot32.
 def rot32(string):
-    """ Return rot32 of a string. """
-    for character in str(string):
-        ord_val = (ord(character.lower()))
-        if not chr(ord_val).isalpha():
-            print(character, end='')
-        elif ord_val <= 109:
-            print((chr(ord_val+13)), end='')
-        else:
-            print((chr(ord_val-13)), end='')
+    """ Print rot32 of a string and return the string. """
+    print(transform(str(string)), end='')
     return string
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert text, stdin or files to rot13.')
+    parser.add_argument('text', nargs='*', help='text to convert, stdin if omitted')
+    parser.add_argument('-f', '--file', action='append', default=[],
+        help='file to convert (repeatable, - for stdin)')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+        help='processes to split large files across')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+        help='bytes read and written per step')
+    args = parser.parse_args()
 
-    # Take in a string from the command line
-    if not sys.stdin.isatty():
-        message = sys.stdin.readlines()
-    else:
-        message = sys.argv[1:]
-
-    # Convert a string to rot32.
-    for line in message:
-        rot32(line)
+    # Buffered binary output, also for stdout
+    output = sys.stdout.buffer
+    try:
+        if args.text:
+            # Take in a string from the command line
+            for line in args.text:
+                output.write(transform(os.fsencode(line)))
+        elif args.file:
+            for path in args.file:
+                if path == '-':
+                    transform_stream(sys.stdin.buffer, output, args.chunk_size)
+                else:
+                    transform_file(path, output, workers=args.workers,
+                        chunk_size=args.chunk_size)
+        else:
+            transform_stream(sys.stdin.buffer, output, args.chunk_size)
+        output.flush()
+    except BrokenPipeError:
+        # Output closed early, e.g. piped into head
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
     sys.exit(0)
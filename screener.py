@@ -0,0 +1,235 @@
+#!/bin/env -S python3
+"""
+Screen a universe of symbols for Bollinger, VWAP and Ichimoku signals.
+
+Price histories are stacked into (symbols x bars) arrays and every
+indicator is computed for all symbols at once along the bar axis. Large
+universes are split into row blocks that worker processes screen in
+parallel. The result is a ranked list of the symbols that meet every
+requested condition at their latest bar.
+$ screener.py bollinger+ichimoku AAPL MSFT NVDA --interval 15m --period 14d
+"""
+
+import os
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+
+# Local imports
+from indicators import IndicatorGraph, as_array
+
+# Conditions a scan can ask for, and what meeting them means
+CONDITIONS = {
+    'bollinger': 'close outside the Bollinger bands',
+    'vwap': 'close away from the VWAP',
+    'ichimoku': 'close outside the Ichimoku cloud',
+}
+
+# Price columns stacked for a scan
+SCAN_COLUMNS = ('High', 'Low', 'Close', 'Volume')
+
+# Symbols per worker task when a scan is split across processes
+SPLIT_SYMBOLS = 128
+
+# Least fraction the close must be away from the VWAP to meet 'vwap'
+VWAP_THRESHOLD = 0.02
+
+# Function to parse a composite condition name.
+def parse_conditions(text):
+    """
+    Condition names of 'bollinger+ichimoku' and the like, in order and
+    without repeats, or None if any of them is unknown.
+    """
+    names = list(dict.fromkeys(name for name in text.lower().split('+') if name))
+    if not names or any(name not in CONDITIONS for name in names):
+        return None
+    return names
+
+# Function to drop histories that stopped updating.
+def current_frames(frames):
+    """
+    {symbol: dataframe} without the empty histories and those whose last
+    bar (first column, Datetime or Date) is older than the latest bar of
+    the universe.
+    """
+    latest = {symbol: frame.iloc[-1, 0] for symbol, frame in frames.items() if len(frame)}
+    if not latest:
+        return {}
+    newest = max(latest.values())
+    return {symbol: frames[symbol] for symbol, last in latest.items() if last >= newest}
+
+# Function to stack price histories into 2-D arrays.
+def stack_frames(frames, columns=SCAN_COLUMNS):
+    """
+    Stack {symbol: dataframe} into (symbols, {column: symbols x bars array}).
+    Histories are aligned on their latest bar and shorter ones are padded
+    with leading NaNs; pass them through current_frames() first so that
+    column -1 is the same bar for every symbol.
+    """
+    symbols = list(frames)
+    bars = max((len(frame) for frame in frames.values()), default=0)
+    stacked = {}
+    for name in columns:
+        array = numpy.full((len(symbols), bars), numpy.nan)
+        for row, symbol in enumerate(symbols):
+            values = as_array(frames[symbol][name])
+            if len(values):
+                array[row, bars - len(values):] = values
+        stacked[name] = array
+    return symbols, stacked
+
+# Function to evaluate the scan conditions on stacked arrays.
+def scan_arrays(columns, **kwargs):
+    """
+    Latest-bar indicator readings of every row of the stacked columns, as a
+    dict of 1-D arrays:
+    'close'
+    'bollinger': position between the bands, -1 at the lower and 1 at the upper band
+    'vwap': fraction the close is above (or below) the VWAP
+    'ichimoku': fraction the close is above the cloud top (negative below
+        the cloud bottom, 0 inside it)
+    """
+
+    # keywords & vars
+    num_of_std  = kwargs.get('num_of_std', 2)
+    window_size = kwargs.get('window_size', 20)
+    tenkan      = kwargs.get('tenkan', 9)
+    kijun       = kwargs.get('kijun', 26)
+    senkou_b    = kwargs.get('senkou_b', 52)
+
+    graph = IndicatorGraph(columns)
+    close = graph.column('Close')
+    last = close[:, -1]
+    bars = close.shape[1]
+
+    # Bollinger: distance from the mean in band widths
+    mean = graph.rolling_mean('Close', window_size)[:, -1]
+    width = graph.rolling_std('Close', window_size)[:, -1] * num_of_std
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        bollinger = (last - mean) / width
+
+    # VWAP over the loaded period, skipping the padding and missing bars
+    volume = graph.column('Volume')
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        vwap = numpy.nansum(close * volume, axis=1) / numpy.nansum(
+            numpy.where(numpy.isnan(close), numpy.nan, volume), axis=1)
+        vwap_distance = last / vwap - 1
+
+    # Ichimoku: the cloud under the latest bar was projected senkou_b bars ago
+    cloud_top = cloud_bottom = numpy.full(len(last), numpy.nan)
+    if bars > senkou_b:
+        tenkan_sen, kijun_sen, senkou_b_line = (graph.midpoint(window)[:, -1 - senkou_b]
+            for window in (tenkan, kijun, senkou_b))
+        senkou_a = (tenkan_sen + kijun_sen) / 2
+        cloud_top = numpy.maximum(senkou_a, senkou_b_line)
+        cloud_bottom = numpy.minimum(senkou_a, senkou_b_line)
+    with numpy.errstate(invalid='ignore'):
+        ichimoku = numpy.where(last > cloud_top, last / cloud_top - 1,
+            numpy.where(last < cloud_bottom, last / cloud_bottom - 1, 0.0))
+    ichimoku[numpy.isnan(cloud_top)] = numpy.nan
+
+    return {'close': last, 'bollinger': bollinger, 'vwap': vwap_distance, 'ichimoku': ichimoku}
+
+# Function to scan a block of rows in a worker process.
+def _scan_block(columns, kwargs):
+    """scan_arrays() for pickled worker arguments."""
+    return scan_arrays(columns, **kwargs)
+
+# Function to describe one reading.
+def _signal(condition, value):
+    """Short text of a met condition, e.g. 'above bands'."""
+    side = 'above' if value > 0 else 'below'
+    return {'bollinger': f'{side} bands', 'vwap': f'{side} vwap', 'ichimoku': f'{side} cloud'}[condition]
+
+# Function to screen a universe.
+def scan(frames, conditions=('bollinger',), **kwargs):
+    """
+    Screen {symbol: dataframe} and return a list of row dicts (symbol,
+    close, signals and every reading) for the symbols meeting all
+    conditions, strongest first by the first condition. Symbols without a
+    current bar are left out. Universes larger than split symbols are
+    split into blocks screened through pool_map, a map() over long-lived
+    worker processes, or with workers > 1 through a pool of that many
+    processes started for this scan.
+    """
+
+    # keywords & vars
+    workers   = kwargs.pop('workers', 1)
+    split     = kwargs.pop('split', SPLIT_SYMBOLS)
+    pool_map  = kwargs.pop('pool_map', None)
+    threshold = kwargs.pop('vwap_threshold', VWAP_THRESHOLD)
+
+    symbols, columns = stack_frames(current_frames(frames))
+    if not symbols:
+        return []
+
+    if len(symbols) > split and (pool_map is not None or workers > 1):
+        blocks = [{name: array[start:start + split] for name, array in columns.items()}
+                  for start in range(0, len(symbols), split)]
+        if pool_map is not None:
+            parts = list(pool_map(_scan_block, blocks, [kwargs] * len(blocks)))
+        else:
+            with ProcessPoolExecutor(max_workers=workers,
+                    mp_context=multiprocessing.get_context('forkserver')) as pool:
+                parts = list(pool.map(_scan_block, blocks, [kwargs] * len(blocks)))
+        readings = {name: numpy.concatenate([part[name] for part in parts]) for name in parts[0]}
+    else:
+        readings = scan_arrays(columns, **kwargs)
+
+    # Which rows meet each condition, and how strongly
+    with numpy.errstate(invalid='ignore'):
+        met = {
+            'bollinger': numpy.abs(readings['bollinger']) > 1,
+            'vwap': numpy.abs(readings['vwap']) > threshold,
+            'ichimoku': readings['ichimoku'] != 0,
+        }
+    selected = numpy.logical_and.reduce([met[name] & numpy.isfinite(readings[name])
+        for name in conditions])
+    strength = numpy.abs(readings[conditions[0]])
+
+    rows = []
+    for row in numpy.flatnonzero(selected)[numpy.argsort(-strength[selected], kind='stable')]:
+        rows.append({
+            'symbol': symbols[row],
+            'close': float(readings['close'][row]),
+            'signals': [_signal(name, readings[name][row]) for name in conditions],
+            **{name: float(readings[name][row]) for name in CONDITIONS},
+        })
+    return rows
+
+# Function to format scan results.
+def scan_table(rows, limit=20):
+    """Monospace table of the first limit rows of scan()."""
+    lines = [f"{'symbol':<8}{'close':>10}{'bb':>7}{'vwap%':>7}{'cloud%':>8}  signals"]
+    for row in rows[:limit]:
+        lines.append(f"{row['symbol']:<8}{row['close']:>10.2f}{row['bollinger']:>7.2f}"
+            f"{row['vwap'] * 100:>7.2f}{row['ichimoku'] * 100:>8.2f}  {', '.join(row['signals'])}")
+    if len(rows) > limit:
+        lines.append(f"... {len(rows) - limit} more")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Screen symbols for indicator signals.')
+    parser.add_argument('conditions', help="conditions joined with '+': " + ', '.join(CONDITIONS))
+    parser.add_argument('symbols', nargs='+', help='symbols to screen')
+    parser.add_argument('--interval', default='15m', help='bar interval')
+    parser.add_argument('--period', default='14d', help='history to load')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+        help='processes to split large universes across')
+    parser.add_argument('--vwap', type=float, default=VWAP_THRESHOLD,
+        help='least fraction away from the VWAP for the vwap condition')
+    parser.add_argument('--top', type=int, default=20, help='rows to print')
+    args = parser.parse_args()
+
+    conditions = parse_conditions(args.conditions)
+    if conditions is None:
+        parser.error(f"unknown conditions: {args.conditions}")
+
+    from market_store import MarketStore
+    store = MarketStore()
+    symbols = [symbol.upper() for symbol in args.symbols]
+    store.refresh_many(symbols, args.interval, args.period)
+    frames = {symbol: store.frame(symbol, args.interval, args.period) for symbol in symbols}
+    print(scan_table(scan(frames, conditions, workers=args.workers, vwap_threshold=args.vwap),
+        args.top))
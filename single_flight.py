@@ -0,0 +1,64 @@
+#!/bin/env -S python3
+"""
+Single-flight call coalescing.
+
+While a call for a key is running, further calls for the same key wait for
+it and share its result (or exception) instead of doing the work again.
+"""
+
+import threading
+from collections import Counter
+
+# Class to hold one in-flight call.
+class _Flight:
+    """Result slot that waiters block on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Class to coalesce identical concurrent calls.
+class SingleFlight:
+    """Runs at most one call per key at a time and counts coalesced calls."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.counters = Counter()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) unless a call for key is already in
+        flight, in which case wait for it and return its result.
+        """
+        kind = key[0] if isinstance(key, tuple) and key else key
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+                self.counters[f'{kind}.executed'] += 1
+            else:
+                self.counters[f'{kind}.coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+        else:
+            try:
+                flight.result = func(*args, **kwargs)
+            except BaseException as error:
+                flight.error = error
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        """Return executed/coalesced counts per key kind (first key element)."""
+        with self.lock:
+            return dict(self.counters)
@@ -0,0 +1,284 @@
+#!/bin/env -S python3
+"""
+Incremental versions of the indicators module for live bar feeds.
+
+Each class takes one new OHLCV bar at a time (any mapping with High, Low,
+Close and Volume keys, such as a DataFrame row) and updates its state in
+amortized constant time. State can be saved with snapshot() and brought back
+with restore(), so a feed can be resumed without replaying its history.
+"""
+
+import math
+from collections import deque
+
+import numpy
+
+# Class to track a rolling max or min with a monotonic deque.
+class RollingExtreme:
+    """
+    Rolling maximum (or minimum) over the last window bars. Every bar is
+    pushed and popped at most once, so each update is amortized O(1).
+    """
+
+    def __init__(self, window, highest=True):
+        self.window = window
+        self.highest = highest
+        self.count = 0
+        self.last_nan = -1 - window
+        self.candidates = deque()
+
+    def update(self, value):
+        """Push a value and return the extreme over the window, NaN until full."""
+        if math.isnan(value):
+            self.last_nan = self.count
+        elif self.highest:
+            while self.candidates and self.candidates[-1][1] <= value:
+                self.candidates.pop()
+        else:
+            while self.candidates and self.candidates[-1][1] >= value:
+                self.candidates.pop()
+        if not math.isnan(value):
+            self.candidates.append((self.count, value))
+        self.count += 1
+
+        # Drop the candidate that just slid out of the window
+        if self.candidates and self.candidates[0][0] <= self.count - 1 - self.window:
+            self.candidates.popleft()
+
+        return self.value()
+
+    def value(self):
+        """Current extreme over the window, NaN until full or while it holds a NaN."""
+        if self.count < self.window or self.last_nan > self.count - 1 - self.window:
+            return math.nan
+        return self.candidates[0][1]
+
+    def snapshot(self):
+        """Return the state as a JSON-serializable dict."""
+        return {'window': self.window, 'highest': self.highest, 'count': self.count,
+                'last_nan': self.last_nan, 'candidates': [list(item) for item in self.candidates]}
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a RollingExtreme from snapshot()."""
+        rolling = cls(state['window'], state['highest'])
+        rolling.count = state['count']
+        rolling.last_nan = state['last_nan']
+        rolling.candidates = deque(tuple(item) for item in state['candidates'])
+        return rolling
+
+# Class to stream Bollinger Bands.
+class StreamingBollinger:
+    """
+    Bollinger Bands from a running mean and sum of squared deviations over
+    the last window_size closes. The running values are re-derived from the
+    window every resync bars, which keeps rounding drift bounded while
+    staying amortized O(1) per bar.
+    """
+
+    def __init__(self, **kwargs):
+        self.num_of_std  = kwargs.get('num_of_std', 2)
+        self.window_size = kwargs.get('window_size', 20)
+        self.resync      = kwargs.get('resync', self.window_size)
+        self.closes = deque(maxlen=self.window_size)
+        self.mean = 0.0
+        self.sqdev = 0.0
+        self.nans = 0
+        self.since_resync = 0
+
+    def _resync(self):
+        """Recompute mean and squared deviations exactly as the batch code does."""
+        window = numpy.fromiter(self.closes, dtype=numpy.float64, count=len(self.closes))
+        self.mean = float(window.mean())
+        deviation = window - self.mean
+        self.sqdev = float(numpy.sum(deviation * deviation))
+        self.since_resync = 0
+
+    def update(self, bar):
+        """Add a bar, return (rolling_mean, upper_band, lower_band)."""
+        close = float(bar['Close'])
+        full = len(self.closes) == self.window_size
+        if full and math.isnan(self.closes[0]):
+            self.nans -= 1
+        if math.isnan(close):
+            self.nans += 1
+
+        if self.nans or math.isnan(self.mean):
+            # A missing close poisons the window until it slides out
+            self.closes.append(close)
+            self.mean = math.nan
+            if not self.nans and len(self.closes) == self.window_size:
+                self._resync()
+        elif not full:
+            # Welford update while the window fills
+            self.closes.append(close)
+            delta = close - self.mean
+            self.mean += delta / len(self.closes)
+            self.sqdev += delta * (close - self.mean)
+            if len(self.closes) == self.window_size:
+                self._resync()
+        else:
+            # Replace the oldest close in a full window
+            oldest = self.closes[0]
+            self.closes.append(close)
+            mean = self.mean + (close - oldest) / self.window_size
+            self.sqdev += (close - oldest) * (close - mean + oldest - self.mean)
+            self.mean = mean
+            self.since_resync += 1
+            if self.since_resync >= self.resync or math.isnan(self.sqdev):
+                self._resync()
+
+        return self.value()
+
+    def value(self):
+        """Current (rolling_mean, upper_band, lower_band), NaN until full."""
+        if len(self.closes) < self.window_size or self.window_size < 2 or self.nans:
+            return math.nan, math.nan, math.nan
+        std = math.sqrt(max(self.sqdev, 0.0) / (self.window_size - 1))
+        return (self.mean, self.mean + std * self.num_of_std,
+                self.mean - std * self.num_of_std)
+
+    def snapshot(self):
+        """Return the state as a JSON-serializable dict."""
+        return {'num_of_std': self.num_of_std, 'window_size': self.window_size,
+                'resync': self.resync, 'closes': list(self.closes), 'mean': self.mean,
+                'sqdev': self.sqdev, 'nans': self.nans, 'since_resync': self.since_resync}
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a StreamingBollinger from snapshot()."""
+        bollinger = cls(num_of_std=state['num_of_std'], window_size=state['window_size'],
+                resync=state['resync'])
+        bollinger.closes.extend(state['closes'])
+        bollinger.mean = state['mean']
+        bollinger.sqdev = state['sqdev']
+        bollinger.nans = state['nans']
+        bollinger.since_resync = state['since_resync']
+        return bollinger
+
+# Class to stream the Volume-Weighted Average Price.
+class StreamingVWAP:
+    """VWAP from running price-volume and volume sums."""
+
+    def __init__(self):
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def update(self, bar):
+        """Add a bar and return the VWAP."""
+        self.price_volume += float(bar['Close']) * float(bar['Volume'])
+        self.volume += float(bar['Volume'])
+        return self.value()
+
+    def value(self):
+        """Current VWAP, NaN before any volume has traded."""
+        if self.volume == 0:
+            return math.nan
+        return self.price_volume / self.volume
+
+    def snapshot(self):
+        """Return the state as a JSON-serializable dict."""
+        return {'price_volume': self.price_volume, 'volume': self.volume}
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a StreamingVWAP from snapshot()."""
+        vwap = cls()
+        vwap.price_volume = state['price_volume']
+        vwap.volume = state['volume']
+        return vwap
+
+# Class to stream the Ichimoku Kinko Hyo lines.
+class StreamingIchimoku:
+    """
+    Ichimoku lines from monotonic-deque rolling highs and lows.
+
+    update() returns the lines for the newest bar i. Senkou_a and Senkou_b are
+    the values plotted senkou_b bars ahead (batch index i + senkou_b) and
+    Chikou_span is the close plotted chikou bars back (batch index i - chikou).
+    """
+
+    def __init__(self, **kwargs):
+        self.tenkan   = kwargs.get('tenkan', 9)
+        self.kijun    = kwargs.get('kijun', 26)
+        self.senkou_b = kwargs.get('senkou_b', 52)
+        self.chikou   = kwargs.get('chikou', 26)
+        self.rolling = {
+            name: (RollingExtreme(window, True), RollingExtreme(window, False))
+            for name, window in (('tenkan', self.tenkan), ('kijun', self.kijun),
+                                 ('senkou_b', self.senkou_b))
+        }
+        self.lines = None
+
+    def update(self, bar):
+        """Add a bar and return a dict of the Ichimoku lines."""
+        high, low = float(bar['High']), float(bar['Low'])
+        mid = {}
+        for name, (highest, lowest) in self.rolling.items():
+            mid[name] = (highest.update(high) + lowest.update(low)) / 2
+
+        self.lines = {
+            'Tenkan_sen':  mid['tenkan'],
+            'Kijun_sen':   mid['kijun'],
+            'Senkou_a':    (mid['tenkan'] + mid['kijun']) / 2,
+            'Senkou_b':    mid['senkou_b'],
+            'Chikou_span': float(bar['Close']),
+        }
+        return self.lines
+
+    def snapshot(self):
+        """Return the state as a JSON-serializable dict."""
+        return {'tenkan': self.tenkan, 'kijun': self.kijun, 'senkou_b': self.senkou_b,
+                'chikou': self.chikou, 'lines': self.lines,
+                'rolling': {name: [highest.snapshot(), lowest.snapshot()]
+                            for name, (highest, lowest) in self.rolling.items()}}
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a StreamingIchimoku from snapshot()."""
+        ichimoku = cls(tenkan=state['tenkan'], kijun=state['kijun'],
+                senkou_b=state['senkou_b'], chikou=state['chikou'])
+        ichimoku.rolling = {name: (RollingExtreme.restore(highest), RollingExtreme.restore(lowest))
+                            for name, (highest, lowest) in state['rolling'].items()}
+        ichimoku.lines = state['lines']
+        return ichimoku
+
+# Class to keep every overlay current for one symbol.
+class StreamingIndicators:
+    """Bollinger, VWAP and Ichimoku kept current together for one feed."""
+
+    def __init__(self, **kwargs):
+        self.bars = 0
+        self.bollinger = StreamingBollinger(**kwargs.get('bollinger', {}))
+        self.vwap = StreamingVWAP()
+        self.ichimoku = StreamingIchimoku(**kwargs.get('ichimoku', {}))
+
+    def update(self, bar):
+        """Add a bar and return the latest value of every indicator."""
+        self.bars += 1
+        return {
+            'bollinger': self.bollinger.update(bar),
+            'vwap': self.vwap.update(bar),
+            'ichimoku': self.ichimoku.update(bar),
+        }
+
+    def extend(self, dataframe):
+        """Feed every row of a DataFrame, oldest first."""
+        for bar in dataframe[['High', 'Low', 'Close', 'Volume']].to_dict('records'):
+            self.update(bar)
+        return self
+
+    def snapshot(self):
+        """Return the state as a JSON-serializable dict."""
+        return {'bars': self.bars, 'bollinger': self.bollinger.snapshot(),
+                'vwap': self.vwap.snapshot(), 'ichimoku': self.ichimoku.snapshot()}
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild StreamingIndicators from snapshot()."""
+        streaming = cls()
+        streaming.bars = state['bars']
+        streaming.bollinger = StreamingBollinger.restore(state['bollinger'])
+        streaming.vwap = StreamingVWAP.restore(state['vwap'])
+        streaming.ichimoku = StreamingIchimoku.restore(state['ichimoku'])
+        return streaming
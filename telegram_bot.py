@@ -3,21 +3,63 @@
 Listen for a command in a telegram channel
 """
 
+import io
 import os
 import sys
-import csv
 import time
 import errno
 import logging
 import netrc
+import functools
+import importlib
+import threading
 import telegram
-import pandas
-import yfinance
+from telegram.utils.request import Request
 from tempfile import gettempdir
 
 # Local imports
-from ask_openai import get_openai_text
-import candlestick_chart as chart
+from ask_openai import get_openai_stream
+from market_store import MarketStore
+from render_cache import RenderCache, fingerprint
+from single_flight import SingleFlight
+from dispatcher import ChatDispatcher
+from update_consumer import UpdateConsumer
+from prewarm import PrewarmScheduler, parse_watchlist
+from output_profiles import OUTPUT_PROFILES
+from chart_options import SYMBOL_PATTERN, INTERVALS, PERIODS, parse_overlays
+from screener import VWAP_THRESHOLD, current_frames, parse_conditions, scan, scan_table
+import tracing
+
+# candlestick_chart (matplotlib, yfinance) is imported by the chart commands,
+# and preloaded in the background once the bot is polling
+
+# Local columnar price store shared by every request
+STORE = MarketStore(os.path.join(gettempdir(), 'yfstore'))
+
+# Encoded charts kept in memory, 64MB budget
+RENDER_CACHE = RenderCache(max_bytes=64 * 1024 * 1024)
+
+# Identical concurrent downloads and renders share one call
+FLIGHTS = SingleFlight()
+
+# Longest message text Telegram accepts
+MESSAGE_LIMIT = 4096
+
+# Most symbols accepted by one /chart
+MAX_SYMBOLS = 12
+
+# Output profile of the charts sent to Telegram, one of OUTPUT_PROFILES
+IMAGE_PROFILE = os.environ.get('BOT_IMAGE_PROFILE', 'telegram-preview')
+
+# Symbols screened by /scan: comma separated, or @path of a file listing them
+SCAN_UNIVERSE = os.environ.get('BOT_SCAN_UNIVERSE', '')
+
+# Symbols per block when a larger /scan universe is split across the
+# dispatcher's worker processes; smaller ones are screened in the command thread
+SCAN_SPLIT = int(os.environ.get('BOT_SCAN_SPLIT', 512))
+
+# Background chart pre-warming, started from main
+PREWARM = None
 
 # Function to get netrc credentials
 def get_netrc_credentials(machine):
@@ -41,25 +83,358 @@ def silentremove(filename):
         if os_error.errno != errno.ENOENT:
             raise
 
-# Function to post a stock chart to telegram
+# Function to parse symbols sent in chat
+def chat_symbols(text):
+    """Symbols of a comma list like 'AAPL,MSFT', or None if any is not a ticker symbol"""
+    symbols = [symbol.upper() for symbol in text.split(',') if symbol]
+    if not symbols or not all(SYMBOL_PATTERN.fullmatch(symbol) for symbol in symbols):
+        return None
+    return list(dict.fromkeys(symbols))
+
+# Function to get stock data by ticker symbol
 def get_ticker_data(symbol, **kwargs):
     """Get stock chart by ticker symbol"""
 
     # keywords & vars
     INTERVAL = kwargs.get('interval', '15m')
     PERIOD = kwargs.get('period', '7d')
+    store = kwargs.get('store', STORE)
+    max_age = kwargs.get('max_age', 300)
+
+    # Read coarser intervals from finer stored bars that cover the period
+    source = store.source(symbol, INTERVAL, PERIOD)
+
+    # Fetch only the bars newer than the stored ones if data is older than 5 minutes,
+    # sharing one download between concurrent requests
+    with tracing.span('data.refresh'):
+        FLIGHTS.do(('download', symbol, source, PERIOD), store.refresh,
+                symbol, source, PERIOD, max_age=max_age)
+
+    # Slice the requested period out of the stored columns
+    with tracing.span('data.slice' if source == INTERVAL else 'data.resample'):
+        dataframe = store.frame(symbol, INTERVAL, PERIOD, source=source)
+    return dataframe if len(dataframe) else None
+
+# Function to get stock data for several ticker symbols
+def get_tickers_data(symbols, **kwargs):
+    """Get stock data for several ticker symbols with one batched download"""
+
+    # keywords & vars
+    INTERVAL = kwargs.get('interval', '15m')
+    PERIOD = kwargs.get('period', '7d')
+    store = kwargs.get('store', STORE)
+
+    # Group the symbols by the interval their bars are read from
+    sources = {symbol: store.source(symbol, INTERVAL, PERIOD) for symbol in symbols}
+    groups = {}
+    for symbol, source in sources.items():
+        groups.setdefault(source, []).append(symbol)
+
+    # Refresh every stale symbol in a single yfinance request per source interval
+    with tracing.span('data.refresh_many'):
+        for source, group in groups.items():
+            FLIGHTS.do(('download', tuple(sorted(group)), source, PERIOD), store.refresh_many,
+                    group, source, PERIOD, max_age=300)
+
+    with tracing.span('data.slice'):
+        frames = {symbol: store.frame(symbol, INTERVAL, PERIOD, source=sources[symbol])
+                for symbol in symbols}
+    return {symbol: frame for symbol, frame in frames.items() if len(frame)}
+
+# Function to reply to /status
+def command_status(bot, message, **kwargs):
+    """Send the bot host and version details"""
+    flights = FLIGHTS.stats()
+    renders = RENDER_CACHE.stats()
+    text=[f"Hi *{message.from_user.first_name}*, I'm {bot.get_me().first_name}!",
+            "---------------------------------------------",
+            f"I'm running on *{os.uname()[1]}* (*{sys.platform}*)",
+            f"Python: *{sys.version.partition(' ')[0]}*",
+            f"Telegram: *{telegram.__version__}*",
+            f"Coalesced: *{flights.get('download.coalesced', 0)}* downloads, "
+            f"*{flights.get('render.coalesced', 0)}* renders",
+            f"Prewarmed: *{renders['warmed']}* charts, *{renders['warm_used']}* used"]
+
+    bot.sendMessage(chat_id=message.chat_id,
+            text="\n".join(text),
+            parse_mode=telegram.ParseMode.MARKDOWN)
+
+# Function to reply to /ask
+def command_ask(bot, message, **kwargs):
+    """Answer an OpenAI question, editing the reply as the answer streams in"""
 
-    csvfile = os.path.expanduser(f'{gettempdir()}/yfdata_{symbol}_{INTERVAL}-{PERIOD}.csv')
+    # keywords & vars
+    edit_interval = kwargs.get('edit_interval', float(os.environ.get('BOT_EDIT_INTERVAL', 1.0)))
+
+    # test if the user has provided a question
+    if len(message.text.split(' ')) > 1:
+        reply = None
+        answer = shown = ''
+        edited = 0.0
+        with tracing.span('ask.openai'):
+            for piece in get_openai_stream(message.text.split(' ')[1], model='text-davinci-002'):
+                answer += piece
+
+                # Telegram trims whitespace and caps the length, so compare what it would show
+                text = answer.strip()[:MESSAGE_LIMIT]
+
+                # Telegram rejects blank messages, so wait for visible text
+                if reply is None and text:
+                    with tracing.span('ask.reply'):
+                        reply = bot.sendMessage(chat_id=message.chat_id, text=text)
+                    shown, edited = text, time.monotonic()
+
+                # Edit at most once per edit_interval to stay under the flood limits,
+                # and only when the visible text changed
+                elif reply is not None and text != shown \
+                        and time.monotonic() - edited >= edit_interval:
+                    with tracing.span('ask.edit'):
+                        bot.editMessageText(chat_id=message.chat_id,
+                                message_id=reply.message_id, text=text)
+                    shown, edited = text, time.monotonic()
+
+        text = answer.strip()[:MESSAGE_LIMIT]
+        if reply is None:
+            bot.sendMessage(chat_id=message.chat_id,
+                    text=text or "Sorry, I got no answer.")
+        elif text != shown:
+            with tracing.span('ask.edit'):
+                bot.editMessageText(chat_id=message.chat_id,
+                        message_id=reply.message_id, text=text)
+    else:
+        bot.sendMessage(chat_id=message.chat_id,
+                text="Sorry, I don't understand your question.")
+
+# Function to reply to /stats
+def command_stats(bot, message, **kwargs):
+    """Send per-stage latency histograms and counters"""
+
+    # keywords & vars
+    metrics_file = kwargs.get('metrics_file', os.environ.get('BOT_METRICS_FILE'))
+
+    if not tracing.TRACER.enabled:
+        bot.sendMessage(chat_id=message.chat_id, text="Tracing is disabled (BOT_TRACING=0).")
+        return
+
+    # Optional stage prefix, e.g. /stats chart
+    prefix = message.text.split(' ')[1] if len(message.text.split(' ')) > 1 else ''
+    counters = {**tracing.TRACER.summary()['counters'], **RENDER_CACHE.stats(), **FLIGHTS.stats()}
+    text = [tracing.TRACER.table(prefix), ''] + \
+            [f"{name}: {value}" for name, value in counters.items()]
 
-    # Get stock data if data is older than 15minutes
-    if not(os.path.exists(csvfile)) or os.stat(csvfile).st_mtime < time.time() - 300:
-        # Read historical data from Yahoo Finance
-        dataframe = yfinance.download(symbol, interval=INTERVAL, period=PERIOD)
-        dataframe.to_csv(csvfile)
+    bot.sendMessage(chat_id=message.chat_id,
+            text="```\n" + "\n".join(text) + "\n```",
+            parse_mode=telegram.ParseMode.MARKDOWN)
 
-    # Load dataframe from csvfile
-    dataframe = pandas.read_csv(csvfile)
-    return dataframe
+    if metrics_file:
+        tracing.TRACER.dump(metrics_file)
+
+# Function to render in the calling thread
+def render_inline(func, *args, **kwargs):
+    """Call a render function directly"""
+    return func(*args, **kwargs)
+
+# Function to reply to /chart
+def command_chart(bot, message, **kwargs):
+    """Post a stock chart"""
+    import candlestick_chart as chart
+
+    # keywords & vars
+    render = kwargs.get('render', render_inline)
+
+    if len(message.text.split(' ')) > 1:
+        SYMBOLS = chat_symbols(message.text.split(' ')[1])
+        if SYMBOLS is None:
+            bot.sendMessage(chat_id=message.chat_id,
+                    text="Please use ticker symbols, e.g. /chart AAPL or /chart AAPL,MSFT")
+            return
+        SYMBOLS = SYMBOLS[:MAX_SYMBOLS]
+        SYMBOL = ','.join(SYMBOLS)
+
+        # Default Values
+        CHART = 'vwap'
+        INTERVAL = '15m'
+        PERIOD = '14d'
+
+        # Parse arguments
+        if len(message.text.split(' ')) > 2:
+            ARGS = message.text.split(' ')[2:]
+
+            for arg in ARGS:
+                if arg.startswith('chart'):
+                    # One overlay or several joined with '+', e.g. bollinger+vwap
+                    overlays = parse_overlays(arg.split('=')[1])
+                    if overlays is not None:
+                        CHART = '+'.join(overlays)
+                elif arg.startswith('interval'):
+                    if arg.split('=')[1] in INTERVALS:
+                        INTERVAL = arg.split('=')[1]
+                elif arg.startswith('period'):
+                    if arg.split('=')[1] in PERIODS:
+                        PERIOD = arg.split('=')[1]
+
+        # Get stock data
+        logging.info(f"Fetching data for {SYMBOL} {INTERVAL}-{PERIOD}")
+        with tracing.span('chart.data'):
+            if len(SYMBOLS) > 1:
+                frames = get_tickers_data(SYMBOLS, interval=INTERVAL, period=PERIOD)
+            else:
+                dataframe = get_ticker_data(SYMBOL, interval=INTERVAL, period=PERIOD)
+                frames = {SYMBOL: dataframe} if dataframe is not None else {}
+
+        # Plot stock data
+        if len(frames) == 1:
+            SYMBOL, dataframe = next(iter(frames.items()))
+            if PREWARM is not None:
+                PREWARM.record(SYMBOL, INTERVAL, PERIOD, CHART)
+
+            # Render graph and overlay, unless unchanged data was charted already
+            with tracing.span('chart.metadata'):
+                name = chart.METADATA.short_name(SYMBOL)
+            key = (SYMBOL, INTERVAL, PERIOD, CHART, IMAGE_PROFILE, fingerprint(dataframe))
+            with tracing.span('chart.render'):
+                image = FLIGHTS.do(('render',) + key, RENDER_CACHE.get_or_render, key,
+                        render, chart.render_image, dataframe,
+                        symbol=SYMBOL, name=name, interval=INTERVAL, period=PERIOD,
+                        chart=CHART, profile=IMAGE_PROFILE)
+
+            # Send graph to telegram
+            with tracing.span('chart.upload'):
+                bot.sendPhoto(chat_id=message.chat_id, photo=io.BytesIO(image),
+                        caption=f"{SYMBOL} chart={CHART} interval={INTERVAL} period={PERIOD}")
+
+        elif frames:
+            SYMBOL = ','.join(frames)
+
+            # Render every symbol as one grid of small multiples
+            key = (SYMBOL, INTERVAL, PERIOD, CHART, IMAGE_PROFILE,
+                    tuple(fingerprint(dataframe) for dataframe in frames.values()))
+            with tracing.span('chart.metadata'):
+                names = {symbol: chart.METADATA.short_name(symbol) for symbol in frames}
+            with tracing.span('chart.render'):
+                image = FLIGHTS.do(('render',) + key, RENDER_CACHE.get_or_render, key,
+                        render, chart.render_grid_image, frames, names=names,
+                        interval=INTERVAL, period=PERIOD, chart=CHART, profile=IMAGE_PROFILE)
+
+            # Send graph to telegram
+            with tracing.span('chart.upload'):
+                bot.sendPhoto(chat_id=message.chat_id, photo=io.BytesIO(image),
+                        caption=f"{SYMBOL} chart={CHART} interval={INTERVAL} period={PERIOD}")
+
+        else:
+            bot.sendMessage(chat_id=message.chat_id,
+                    text=f"Sorry, I don't understand your request.")
+    else:
+        bot.sendMessage(chat_id=message.chat_id,
+                text="Missing arguments. Please use /chart <symbol>[,<symbol>...] <args>")
+
+# Function to pre-render a chart into the render cache
+def warm_chart(symbol, interval, period, chart_type, **kwargs):
+    """Refresh a chart's data right after a bar closes and pre-render it"""
+    import candlestick_chart as chart
+
+    # keywords & vars
+    render = kwargs.get('render', render_inline)
+
+    dataframe = get_ticker_data(symbol, interval=interval, period=period, max_age=0)
+    if dataframe is None:
+        return
+
+    key = (symbol, interval, period, chart_type, IMAGE_PROFILE, fingerprint(dataframe))
+    if key not in RENDER_CACHE:
+        image = FLIGHTS.do(('render',) + key, render, chart.render_image, dataframe,
+                symbol=symbol, name=chart.METADATA.short_name(symbol),
+                interval=interval, period=period, chart=chart_type, profile=IMAGE_PROFILE)
+        RENDER_CACHE.put(key, image, warmed=True)
+
+# Function to read the /scan universe
+def scan_universe(spec):
+    """
+    Symbols of BOT_SCAN_UNIVERSE: 'AAPL,MSFT' or '@path', a file of
+    whitespace or comma separated symbols
+    """
+    if spec.startswith('@'):
+        with open(os.path.expanduser(spec[1:]), encoding='utf-8') as universefile:
+            spec = universefile.read()
+    return list(dict.fromkeys(symbol.upper() for symbol in spec.replace(',', ' ').split()))
+
+# Function to reply to /scan
+def command_scan(bot, message, **kwargs):
+    """Screen the symbol universe and send a ranked table"""
+
+    # keywords & vars
+    universe = kwargs.get('universe', SCAN_UNIVERSE)
+    pool_map = kwargs.get('pool_map')
+    SYMBOLS  = None
+
+    # Default Values
+    CONDITIONS = ['bollinger']
+    INTERVAL = '15m'
+    PERIOD = '14d'
+    TOP = 20
+    VWAP = VWAP_THRESHOLD
+
+    # Parse arguments: /scan [bollinger+ichimoku] [interval=] [period=] [top=] [vwap=] [symbols=]
+    for arg in message.text.split(' ')[1:]:
+        if arg.startswith('interval='):
+            if arg.split('=')[1] in ['1m', '5m', '15m', '30m', '1h', '1d']:
+                INTERVAL = arg.split('=')[1]
+        elif arg.startswith('period='):
+            if arg.split('=')[1] in ['1d', '7d', '14d', '1w', '1m', '3m', '1y']:
+                PERIOD = arg.split('=')[1]
+        elif arg.startswith('top='):
+            if arg.split('=')[1].isdigit():
+                TOP = min(int(arg.split('=')[1]), 50)
+        elif arg.startswith('vwap='):
+            try:
+                if 0 <= float(arg.split('=')[1]) <= 1:
+                    VWAP = float(arg.split('=')[1])
+            except ValueError:
+                pass
+        elif arg.startswith('symbols='):
+            SYMBOLS = chat_symbols(arg.split('=', 1)[1])
+            if SYMBOLS is None:
+                bot.sendMessage(chat_id=message.chat_id,
+                        text="symbols= takes a comma list of ticker symbols, e.g. symbols=AAPL,MSFT")
+                return
+        elif parse_conditions(arg) is not None:
+            CONDITIONS = parse_conditions(arg)
+
+    if SYMBOLS is None:
+        SYMBOLS = scan_universe(universe)
+    if not SYMBOLS:
+        bot.sendMessage(chat_id=message.chat_id,
+                text="No symbols to scan. Set BOT_SCAN_UNIVERSE or use /scan symbols=<symbol>,...")
+        return
+
+    # Load the whole universe with batched downloads, then screen it in one pass
+    logging.info(f"Scanning {len(SYMBOLS)} symbols {INTERVAL}-{PERIOD} for {CONDITIONS}")
+    with tracing.span('scan.data'):
+        frames = get_tickers_data(SYMBOLS, interval=INTERVAL, period=PERIOD)
+    with tracing.span('scan.screen'):
+        current = current_frames(frames)
+        rows = scan(current, CONDITIONS, pool_map=pool_map, split=SCAN_SPLIT,
+                vwap_threshold=VWAP)
+
+    text = [f"{len(rows)} of {len(current)} symbols match {'+'.join(CONDITIONS)} "
+            f"({INTERVAL}, {PERIOD})"]
+    stale = sorted(set(frames) - set(current))
+    if stale:
+        text.append(f"Skipped {len(stale)} without a current bar: {', '.join(stale[:10])}"
+                + (", ..." if len(stale) > 10 else ""))
+    if rows:
+        text.append("```\n" + scan_table(rows, TOP) + "\n```")
+    bot.sendMessage(chat_id=message.chat_id, text="\n".join(text),
+            parse_mode=telegram.ParseMode.MARKDOWN)
+
+# Commands run through the dispatcher
+COMMANDS = {
+    '/status': command_status,
+    '/ask': command_ask,
+    '/chart': command_chart,
+    '/stats': command_stats,
+    '/scan': command_scan,
+}
 
 if __name__ == '__main__':
     # Set environment basename for output files
@@ -72,123 +447,73 @@ if __name__ == '__main__':
             datefmt='%Y-%m-%d %H:%M:%S',
             filename=logfile, encoding='utf-8')
 
+    # Fail now rather than on the first chart
+    if IMAGE_PROFILE not in OUTPUT_PROFILES:
+        logging.error(f"Unknown BOT_IMAGE_PROFILE {IMAGE_PROFILE!r}")
+        sys.exit(f"Unknown BOT_IMAGE_PROFILE {IMAGE_PROFILE!r}, use one of: "
+                + ', '.join(OUTPUT_PROFILES))
+
+    # Concurrency limits
+    IO_WORKERS = int(os.environ.get('BOT_IO_WORKERS', 16))
+    RENDER_WORKERS = int(os.environ.get('BOT_RENDER_WORKERS', 2))
+    ASK_LIMIT = int(os.environ.get('BOT_ASK_LIMIT', 4))
+
     # Fetch telegram credentials
     token = get_netrc_credentials('telegram')[1]
 
-    # using the telegram bot api to receive messages in a telegram channel
-    bot = telegram.Bot(token=token)
+    # using the telegram bot api to receive messages in a telegram channel,
+    # with a connection per worker thread (TELEGRAM_BASE_URL points it at fake_telegram.py)
+    bot = telegram.Bot(token=token, base_url=os.environ.get('TELEGRAM_BASE_URL'),
+            request=Request(con_pool_size=IO_WORKERS + 4))
     logging.info(f"{bot.get_me()}")
-    last_message_id = None
+    dispatcher = ChatDispatcher(io_workers=IO_WORKERS, render_workers=RENDER_WORKERS,
+            limits={'/ask': ASK_LIMIT})
+
+    # Pre-warm the watchlist and the most requested charts after every bar close
+    PREWARM = PrewarmScheduler(functools.partial(warm_chart, render=dispatcher.render),
+            watchlist=parse_watchlist(os.environ.get('BOT_WATCHLIST', '')),
+            top_n=int(os.environ.get('BOT_PREWARM_TOP', 10)),
+            time_budget=float(os.environ.get('BOT_PREWARM_BUDGET', 0.25)),
+            session=STORE.session).start()
+
+    # Load the charting stack while the first poll waits
+    threading.Thread(target=importlib.import_module, args=('candlestick_chart',),
+            name='preload', daemon=True).start()
+
+    # Long-poll for updates, remembering the offset across restarts
+    consumer = UpdateConsumer(bot, os.path.expanduser(f'{basename}.offset'), timeout=30)
     RUNNING = True
 
     while RUNNING:
 
-        # Get updates from telegram
-        for update in bot.getUpdates(-1):
+        # Wait for the next batch of updates from telegram
+        for update in consumer.poll():
 
             try:
                 # if entities.type == 'bot_command' then send a message to the telegram channel
-                if (update.message.entities[0].type == 'bot_command'): # and (update.message.chat.type == 'private'):
-                    if (last_message_id != update.message.message_id) and (last_message_id is not None):
-                        last_message_id = update.message.message_id
-                        command = update.message.text.split(' ')[0]
-                        logging.info(f"{update}")
-
-                        #print(f"Command: {command}")
-
-                        # Command is a request for status
-                        if command == '/status':
-                            message=[f"Hi *{update.message.from_user.first_name}*, I'm {bot.get_me().first_name}!",
-                                    "---------------------------------------------",
-                                    f"I'm running on *{os.uname()[1]}* (*{sys.platform}*)",
-                                    f"Python: *{sys.version.partition(' ')[0]}*",
-                                    f"Telegram: *{telegram.__version__}*"]
-
-                            bot.sendMessage(chat_id=update.message.chat_id,
-                                    text="\n".join(message),
-                                    parse_mode=telegram.ParseMode.MARKDOWN)
-
-                        # Command is requesting an OpenAI question.
-                        elif command == '/ask':
-
-                            # test if the user has provided a question
-                            if len(update.message.text.split(' ')) > 1:
-                                message = get_openai_text(update.message.text.split(' ')[1], model='text-davinci-002')
-                                bot.sendMessage(chat_id=update.message.chat_id,
-                                        text=f"{message}")
-                            else:
-                                bot.sendMessage(chat_id=update.message.chat_id,
-                                        text="Sorry, I don't understand your question.")
-
-                        # Command is requesting a stock chart.
-                        elif command == '/chart':
-                            if len(update.message.text.split(' ')) > 1:
-                                SYMBOL = update.message.text.split(' ')[1].upper()
-
-                                # Default Values
-                                CHART = 'vwap'
-                                INTERVAL = '15m'
-                                PERIOD = '14d'
-
-                                # Parse arguments
-                                if len(update.message.text.split(' ')) > 2:
-                                    ARGS = update.message.text.split(' ')[2:]
-
-                                    for arg in ARGS:
-                                        if arg.startswith('chart'):
-                                            if arg.split('=')[1] in ['bollinger', 'ichimoku', 'vwap']:
-                                                CHART = arg.split('=')[1]
-                                        elif arg.startswith('interval'):
-                                            if arg.split('=')[1] in ['1m', '5m', '15m', '30m', '1h', '1d']:
-                                                INTERVAL = arg.split('=')[1]
-                                        elif arg.startswith('period'):
-                                            if arg.split('=')[1] in ['1d', '7d', '14d', '1w', '1m', '3m', '1y']:
-                                                PERIOD = arg.split('=')[1]
-
-                                # Get stock data
-                                print(f"Fetching data for {SYMBOL} {INTERVAL}-{PERIOD}")
-                                dataframe = get_ticker_data(SYMBOL, interval=INTERVAL, period=PERIOD)
-
-                                # Plot stock data
-                                if dataframe is not None:
-
-                                    # Create graph and overlay
-                                    graph = chart.graph_candlestick(dataframe, symbol=SYMBOL, interval=INTERVAL, period=PERIOD)
-                                    if CHART == 'bollinger':
-                                        graph = chart.overlay_bollinger(dataframe)
-                                    elif CHART == 'ichimoku':
-                                        graph = chart.overlay_ichimoku(dataframe)
-                                    else:
-                                        graph = chart.overlay_vwap(dataframe)
-
-                                    # Save graph to file
-                                    graph.savefig(f'{gettempdir()}/chart_{SYMBOL}_{INTERVAL}-{PERIOD}.png',
-                                            dpi=600, bbox_inches='tight', pad_inches=0.1)
-                                    graph.close()
-
-                                    # Send graph to telegram
-                                    with open(f'{gettempdir()}/chart_{SYMBOL}_{INTERVAL}-{PERIOD}.png', 'rb') as photo:
-                                        bot.sendPhoto(chat_id=update.message.chat_id, photo=photo,
-                                                caption=f"{SYMBOL} chart={CHART} interval={INTERVAL} period={PERIOD}")
-
-                                else:
-                                    bot.sendMessage(chat_id=update.message.chat_id,
-                                            text=f"Sorry, I don't understand your request.")
-                            else:
-                                bot.sendMessage(chat_id=update.message.chat_id,
-                                        text="Missing arguments. Please use /chart <symbol> <args>")
-
-                        # Command is requesting to stop the bot.
-                        elif command == '/die':
-                            RUNNING = False
-                            bot.sendMessage(chat_id=update.message.chat_id,
-                                    text="Bye!")
-
-                    else:
-                        last_message_id = update.message.message_id
-            except:
-                # Do nothing!
-                pass
-
-        # Be nice to the telegram API and sleep for 5 seconds
-        time.sleep(5)
+                if update.message and update.message.entities and \
+                        (update.message.entities[0].type == 'bot_command'): # and (update.message.chat.type == 'private'):
+                    command = update.message.text.split(' ')[0]
+                    logging.info(f"{update}")
+
+                    # Command is requesting to stop the bot.
+                    if command == '/die':
+                        RUNNING = False
+                        bot.sendMessage(chat_id=update.message.chat_id,
+                                text="Bye!")
+
+                    # Queue the command behind earlier ones from the same chat
+                    elif command in COMMANDS:
+                        dispatcher.submit(update.message.chat_id, command, COMMANDS[command],
+                                bot, update.message, render=dispatcher.render,
+                                pool_map=dispatcher.map)
+            except Exception:
+                logging.exception("Could not handle update %s", update.update_id)
+
+    # Let running commands finish
+    PREWARM.stop()
+    dispatcher.shutdown()
+
+    # Keep the final latency metrics
+    if os.environ.get('BOT_METRICS_FILE') and tracing.TRACER.enabled:
+        tracing.TRACER.dump(os.environ['BOT_METRICS_FILE'])
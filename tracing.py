@@ -0,0 +1,178 @@
+#!/bin/env -S python3
+"""
+Lightweight latency tracing for the bot command pipeline.
+
+Wrap a stage in `with tracing.span('chart.download'):` to add its duration
+to a fixed-size log-bucketed histogram. Counters track events such as
+errors. When tracing is disabled span() hands back a shared no-op context
+manager, so instrumented code pays only a function call.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import Counter
+from contextlib import nullcontext
+
+# Histogram buckets per doubling of latency
+BUCKETS_PER_OCTAVE = 8
+
+# Shared no-op span used while tracing is disabled
+NULL_SPAN = nullcontext()
+
+# Class to accumulate a latency distribution.
+class Histogram:
+    """Log-bucketed latency histogram with about 9% bucket resolution."""
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add one observation."""
+        bucket = math.floor(math.log2(max(seconds, 1e-9)) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Upper edge of the bucket holding the given percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE), self.max)
+        return self.max
+
+    def summary(self):
+        """Count, mean and percentiles in milliseconds."""
+        return {'count': self.count,
+                'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'p50_ms': self.percentile(50) * 1000,
+                'p90_ms': self.percentile(90) * 1000,
+                'p99_ms': self.percentile(99) * 1000,
+                'max_ms': self.max * 1000}
+
+# Class to time one stage.
+class _Span:
+    """Context manager adding its elapsed time to a tracer histogram."""
+
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.tracer.record(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.tracer.count(f'{self.name}.errors')
+        return False
+
+# Class to collect spans and counters.
+class Tracer:
+    """Thread-safe collection of named histograms and counters."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = Counter()
+        self.started = time.time()
+
+    def span(self, name):
+        """Context manager timing a stage, or a no-op while disabled."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        """Add an observation to the histogram called name."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def count(self, name, amount=1):
+        """Increase the counter called name."""
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def drain(self):
+        """Return and forget every raw observation as mergeable state."""
+        with self.lock:
+            state = {'histograms': {name: (dict(histogram.buckets), histogram.count,
+                                           histogram.total, histogram.max)
+                                    for name, histogram in self.histograms.items()},
+                     'counters': dict(self.counters)}
+            self.histograms = {}
+            self.counters = Counter()
+        return state
+
+    def merge(self, state):
+        """Fold drain() output from another process into this tracer."""
+        with self.lock:
+            for name, (buckets, count, total, maximum) in state['histograms'].items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.buckets.update(buckets)
+                histogram.count += count
+                histogram.total += total
+                histogram.max = max(histogram.max, maximum)
+            self.counters.update(state['counters'])
+
+    def summary(self):
+        """Return {'spans': {name: summary}, 'counters': {...}}."""
+        with self.lock:
+            return {'since': self.started,
+                    'spans': {name: histogram.summary()
+                              for name, histogram in sorted(self.histograms.items())},
+                    'counters': dict(sorted(self.counters.items()))}
+
+    def dump(self, path):
+        """Atomically write summary() as JSON to path."""
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as metricsfile:
+            json.dump(self.summary(), metricsfile, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+    def table(self, prefix=''):
+        """Plain-text table of the spans whose name starts with prefix."""
+        lines = [f"{'stage':<24}{'n':>6}{'p50':>9}{'p99':>9}"]
+        for name, stats in self.summary()['spans'].items():
+            if name.startswith(prefix):
+                lines.append(f"{name:<24}{stats['count']:>6}"
+                             f"{stats['p50_ms']:>7.0f}ms{stats['p99_ms']:>7.0f}ms")
+        return '\n'.join(lines)
+
+# Process-wide tracer, disabled with BOT_TRACING=0
+TRACER = Tracer(enabled=os.environ.get('BOT_TRACING', '1') != '0')
+
+# Function to time a stage with the process-wide tracer.
+def span(name):
+    """Shortcut for TRACER.span(name)."""
+    return TRACER.span(name)
+
+# Function to run a call and collect the spans it produced.
+def capture(func, *args, **kwargs):
+    """
+    Call func in a worker process and return (result, TRACER.drain()), so
+    the parent can merge the worker's spans into its own tracer.
+    """
+    result = func(*args, **kwargs)
+    return result, TRACER.drain()
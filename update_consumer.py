@@ -0,0 +1,78 @@
+#!/bin/env -S python3
+"""
+Telegram update consumer using long polling.
+
+getUpdates is called with the offset of the next unseen update and a
+server-side timeout, so Telegram holds the request open until something
+arrives and returns every pending update in one batch. The offset is saved
+to disk, which acknowledges the batch across restarts. Network errors and
+flood waits are logged and retried after a pause instead of being raised.
+"""
+
+import os
+import time
+import logging
+from telegram.error import NetworkError, RetryAfter
+
+# Class to long-poll Telegram for updates.
+class UpdateConsumer:
+    """
+    Yields batches of updates from bot.get_updates, tracking the offset in
+    offset_file (if given) so nothing is dropped or delivered twice.
+    """
+
+    def __init__(self, bot, offset_file=None, **kwargs):
+        self.bot = bot
+        self.offset_file = offset_file
+        self.timeout = kwargs.get('timeout', 30)
+        self.limit = kwargs.get('limit', 100)
+        self.allowed_updates = kwargs.get('allowed_updates', ['message'])
+        # Pause after a failed poll, doubled per failure in a row up to max_retry_delay
+        self.retry_delay = kwargs.get('retry_delay', 1)
+        self.max_retry_delay = kwargs.get('max_retry_delay', 30)
+        self.failures = 0
+        self.offset = None
+        if offset_file is not None and os.path.exists(offset_file):
+            with open(offset_file, encoding='utf-8') as offsetfile:
+                self.offset = int(offsetfile.read().strip() or 0) or None
+
+    def _save_offset(self):
+        """Atomically persist the next offset."""
+        if self.offset_file is None:
+            return
+        with open(f'{self.offset_file}.tmp', 'w', encoding='utf-8') as offsetfile:
+            offsetfile.write(f'{self.offset}\n')
+        os.replace(f'{self.offset_file}.tmp', self.offset_file)
+
+    def poll(self):
+        """
+        Wait up to timeout seconds for updates and return them, oldest
+        first. The batch is acknowledged before it is returned. After a
+        network error or flood wait, pause and return no updates; the
+        offset is unchanged, so they arrive with the next poll.
+        """
+        try:
+            updates = self.bot.get_updates(offset=self.offset, limit=self.limit,
+                timeout=self.timeout, allowed_updates=self.allowed_updates)
+        except RetryAfter as error:
+            logging.warning("Telegram asked to wait %s s before polling again", error.retry_after)
+            time.sleep(error.retry_after)
+            return []
+        except NetworkError as error:
+            self.failures += 1
+            delay = min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay)
+            logging.warning("Polling failed (%s), retrying in %s s", error, delay)
+            time.sleep(delay)
+            return []
+
+        self.failures = 0
+        if updates:
+            self.offset = updates[-1].update_id + 1
+            self._save_offset()
+            logging.debug("Received %d updates, next offset %d", len(updates), self.offset)
+        return updates
+
+    def __iter__(self):
+        """Yield updates forever, one at a time."""
+        while True:
+            yield from self.poll()